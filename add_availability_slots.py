@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Create availability_slots and user_availability_slots tables and backfill them from the JSON time_slots
+"""
+import os
+from app import app, db
+from models import Availability, UserAvailability, UserAvailabilitySlot
+
+def add_availability_slot_tables():
+    with app.app_context():
+        db.create_all()
+        print("✅ Created availability_slots and user_availability_slots tables")
+        
+        # Legacy availability: one set of slot rows per record
+        availabilities = Availability.query.all()
+        for availability in availabilities:
+            availability.set_time_slots(availability.time_slots or [])
+        db.session.commit()
+        print(f"✅ Backfilled slots for {len(availabilities)} availability records")
+        
+        # User availability: slot rows mirror each user's most recent record
+        latest = {}
+        for availability in UserAvailability.query.order_by(UserAvailability.updated_at).all():
+            latest[availability.user_id] = availability
+        for availability in latest.values():
+            UserAvailabilitySlot.sync_for_user(availability.user_id, availability.time_slots or [], availability.week_start_date)
+        db.session.commit()
+        print(f"✅ Backfilled slots for {len(latest)} users")
+
+if __name__ == '__main__':
+    add_availability_slot_tables()
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Add version column to user_availability table
+"""
+import os
+from app import app, db
+from sqlalchemy import text
+
+def add_version_column():
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                conn.execute(text('ALTER TABLE user_availability ADD COLUMN version INTEGER DEFAULT 0'))
+                conn.commit()
+                print("✅ Added version column to user_availability table")
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            print("Column may already exist or database error occurred")
+
+if __name__ == '__main__':
+    add_version_column()
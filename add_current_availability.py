@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Add current_availability_id pointer column to users table and backfill it
+with each user's most recently updated availability
+"""
+import os
+from app import app, db
+from models import User, UserAvailability
+from sqlalchemy import text
+
+def add_current_availability_column():
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                conn.execute(text('ALTER TABLE users ADD COLUMN current_availability_id INTEGER REFERENCES user_availability(id)'))
+                conn.commit()
+                print("✅ Added current_availability_id column to users table")
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            print("Column may already exist or database error occurred")
+
+        # Backfill pointers, oldest first so the most recent availability wins
+        latest = {}
+        for availability in UserAvailability.query.order_by(UserAvailability.updated_at).all():
+            latest[availability.user_id] = availability.id
+
+        count = 0
+        for user in User.query.filter(User.id.in_(list(latest.keys()))).all():
+            if user.current_availability_id != latest[user.id]:
+                user.current_availability_id = latest[user.id]
+                count += 1
+        db.session.commit()
+        print(f"✅ Backfilled current_availability_id for {count} users")
+
+if __name__ == '__main__':
+    add_current_availability_column()
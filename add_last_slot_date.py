@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Add last_slot_date column to user_availability table and backfill existing rows
+"""
+import os
+from app import app, db
+from models import UserAvailability
+from sqlalchemy import text
+
+def add_last_slot_date_column():
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                conn.execute(text('ALTER TABLE user_availability ADD COLUMN last_slot_date DATE'))
+                conn.commit()
+                print("✅ Added last_slot_date column to user_availability table")
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            print("Column may already exist or database error occurred")
+        
+        # Backfill from each row's time_slots
+        availabilities = UserAvailability.query.all()
+        for availability in availabilities:
+            availability.set_time_slots(availability.time_slots or [])
+        db.session.commit()
+        print(f"✅ Backfilled last_slot_date for {len(availabilities)} availability records")
+
+if __name__ == '__main__':
+    add_last_slot_date_column()
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Add (planner_id, id) index to notifications table for cursor pagination
+"""
+import os
+from app import app, db
+from sqlalchemy import text
+
+def add_notification_index():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_notifications_planner_id_id ON notifications (planner_id, id)'))
+            conn.commit()
+            print("✅ Indexed notifications (planner_id, id)")
+
+if __name__ == '__main__':
+    add_notification_index()
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Add rollup_count column to notifications table
+"""
+import os
+from app import app, db
+from sqlalchemy import text
+
+def add_rollup_count_column():
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                conn.execute(text('ALTER TABLE notifications ADD COLUMN rollup_count INTEGER DEFAULT 1'))
+                conn.commit()
+                print("✅ Added rollup_count column to notifications table")
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            print("Column may already exist or database error occurred")
+
+if __name__ == '__main__':
+    add_rollup_count_column()
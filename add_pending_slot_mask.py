@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Add pending_slot_mask and pending_slot_week columns to users table
+"""
+import os
+from app import app, db
+from sqlalchemy import text
+
+def add_pending_slot_mask_columns():
+    with app.app_context():
+        for column, column_type in [('pending_slot_mask', 'BIGINT'), ('pending_slot_week', 'DATE')]:
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text(f'ALTER TABLE users ADD COLUMN {column} {column_type}'))
+                    conn.commit()
+                    print(f"✅ Added {column} column to users table")
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                print("Column may already exist or database error occurred")
+
+if __name__ == '__main__':
+    add_pending_slot_mask_columns()
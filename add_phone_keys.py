@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Add indexed phone_key columns to users and contacts and backfill existing rows
+"""
+import os
+from app import app, db
+from models import User, Contact, phone_key
+from sqlalchemy import text
+
+def add_phone_key_columns():
+    with app.app_context():
+        for table in ['users', 'contacts']:
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN phone_key VARCHAR(10)'))
+                    conn.commit()
+                    print(f"✅ Added phone_key column to {table} table")
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                print("Column may already exist or database error occurred")
+
+            with db.engine.connect() as conn:
+                conn.execute(text(f'CREATE INDEX IF NOT EXISTS ix_{table}_phone_key ON {table} (phone_key)'))
+                conn.commit()
+                print(f"✅ Indexed {table}.phone_key")
+
+        # Backfill keys for existing rows
+        for model in [User, Contact]:
+            count = 0
+            for row in model.query.filter(model.phone_key.is_(None)).all():
+                row.phone_key = phone_key(row.phone_number)
+                count += 1
+            db.session.commit()
+            print(f"✅ Backfilled phone_key for {count} {model.__tablename__}")
+
+if __name__ == '__main__':
+    add_phone_key_columns()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Add push coalescing columns to push_queue table
+"""
+import os
+from app import app, db
+from sqlalchemy import text
+
+def add_push_coalescing_columns():
+    with app.app_context():
+        for column, column_type in [
+            ('coalesce_key', 'VARCHAR(100)'),
+            ('coalesce_count', 'INTEGER DEFAULT 1'),
+            ('summary_title', 'VARCHAR(200)'),
+            ('summary_body', 'VARCHAR(500)')
+        ]:
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text(f'ALTER TABLE push_queue ADD COLUMN {column} {column_type}'))
+                    conn.commit()
+                    print(f"✅ Added {column} column to push_queue table")
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                print("Column may already exist or database error occurred")
+        
+        with db.engine.connect() as conn:
+            conn.execute(text('CREATE INDEX IF NOT EXISTS ix_push_queue_user_coalesce_key ON push_queue (user_id, coalesce_key)'))
+            conn.commit()
+            print("✅ Indexed push_queue (user_id, coalesce_key)")
+
+if __name__ == '__main__':
+    add_push_coalescing_columns()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Add delivery tracking columns to push_queue table
+"""
+import os
+from app import app, db
+from sqlalchemy import text
+
+def add_push_queue_columns():
+    with app.app_context():
+        for column, column_type in [
+            ('notification_id', 'INTEGER'),
+            ('attempts', 'INTEGER DEFAULT 0'),
+            ('last_error', 'VARCHAR(500)'),
+            ('next_attempt_at', 'TIMESTAMP')
+        ]:
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text(f'ALTER TABLE push_queue ADD COLUMN {column} {column_type}'))
+                    conn.commit()
+                    print(f"✅ Added {column} column to push_queue table")
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                print("Column may already exist or database error occurred")
+
+if __name__ == '__main__':
+    add_push_queue_columns()
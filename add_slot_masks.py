@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Add slot_mask columns to user_availability and availability tables and backfill existing rows
+"""
+import os
+from app import app, db
+from models import UserAvailability, Availability
+from sqlalchemy import text
+
+def add_slot_mask_columns():
+    with app.app_context():
+        for table in ['user_availability', 'availability']:
+            try:
+                with db.engine.connect() as conn:
+                    conn.execute(text(f'ALTER TABLE {table} ADD COLUMN slot_mask BIGINT DEFAULT 0'))
+                    conn.commit()
+                    print(f"✅ Added slot_mask column to {table} table")
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                print("Column may already exist or database error occurred")
+        
+        # Backfill masks from each row's time_slots
+        for model in [UserAvailability, Availability]:
+            rows = model.query.all()
+            for row in rows:
+                row.set_time_slots(row.time_slots or [])
+            db.session.commit()
+            print(f"✅ Backfilled slot_mask for {len(rows)} {model.__tablename__} records")
+
+if __name__ == '__main__':
+    add_slot_mask_columns()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Add unread_notification_count column to users table and backfill it from notifications
+"""
+import os
+from app import app, db
+from models import User
+from sqlalchemy import text
+
+def add_unread_notification_count_column():
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                conn.execute(text('ALTER TABLE users ADD COLUMN unread_notification_count INTEGER DEFAULT 0'))
+                conn.commit()
+                print("✅ Added unread_notification_count column to users table")
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            print("Column may already exist or database error occurred")
+        
+        # Backfill counts for every user
+        User.recount_unread_notifications(db.select(User.id))
+        db.session.commit()
+        print("✅ Backfilled unread_notification_count")
+
+if __name__ == '__main__':
+    add_unread_notification_count_column()
@@ -1,14 +1,18 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response
 from flask_cors import CORS
 from flask_migrate import Migrate
-from models import db, User, Contact, Plan, PlanGuest, Availability, Notification, PasswordReset, FriendRequest, Friendship, UserAvailability, Hangout, HangoutInvitee, PushSubscription, HangoutMessage, AiChatMessage
+from models import db, phone_key, SLOT_NAMES, SLOT_MASK_DAYS, encode_slot_mask, decode_slot_mask, shift_slot_mask, slot_mask_counts, User, Contact, Plan, PlanGuest, Availability, Notification, PasswordReset, FriendRequest, Friendship, UserAvailability, AvailabilitySlot, UserAvailabilitySlot, FriendSlotCount, Hangout, HangoutInvitee, PushSubscription, QueuedPush, HangoutMessage, AiChatMessage
 from datetime import datetime, timedelta, date
 from twilio.rest import Client
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, Email, To, Content
 import json
 import os
+import queue
+import threading
+import time
 import openai
+from sqlalchemy import event
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,41 +31,19 @@ def normalize_phone(phone):
     return '+' + digits
 
 def find_user_by_phone(phone):
-    """Find a user by phone number, trying multiple formats"""
+    """Find a user by phone number, matching on the last 10 digits"""
     if not phone:
         print(f"[FIND_USER] No phone provided")
         return None
     
-    normalized = normalize_phone(phone)
-    print(f"[FIND_USER] Searching for phone: {phone} (normalized: {normalized})")
+    key = phone_key(phone)
+    print(f"[FIND_USER] Searching for phone: {phone} (key: {key})")
     
-    # Try exact match first
-    user = User.query.filter_by(phone_number=phone).first()
+    user = User.query.filter_by(phone_key=key).first() if key else None
     if user:
-        print(f"[FIND_USER] Found by exact match: {user.name}")
+        print(f"[FIND_USER] Found: {user.name} (phone: {user.phone_number})")
         return user
     
-    # Try normalized match
-    user = User.query.filter_by(phone_number=normalized).first()
-    if user:
-        print(f"[FIND_USER] Found by normalized match: {user.name}")
-        return user
-    
-    # Try matching just the digits (last 10)
-    digits = re.sub(r'\D', '', phone)
-    if len(digits) >= 10:
-        last_10 = digits[-10:]
-        print(f"[FIND_USER] Trying last 10 digits match: {last_10}")
-        # Search for any phone containing these last 10 digits
-        users = User.query.all()
-        for u in users:
-            if not u.phone_number:
-                continue
-            u_digits = re.sub(r'\D', '', u.phone_number)
-            if len(u_digits) >= 10 and u_digits[-10:] == last_10:
-                print(f"[FIND_USER] Found by last 10 digits: {u.name} (phone: {u.phone_number})")
-                return u
-    
     print(f"[FIND_USER] No user found for phone: {phone}")
     return None
 
@@ -124,6 +106,22 @@ def get_monday_of_week(date=None):
     return date - timedelta(days=date.weekday())
 
 
+def bump_friends_version(user_ids):
+    """Invalidate the cached friends' availability of these users (list of ids or a select)"""
+    User.query.filter(User.id.in_(user_ids)).update(
+        {User.friends_version: db.func.coalesce(User.friends_version, 0) + 1},
+        synchronize_session=False
+    )
+
+
+def delete_notifications(query):
+    """Delete the notifications matched by query and fix their recipients' unread counts"""
+    planner_ids = [row[0] for row in query.filter(Notification.read == False).with_entities(Notification.planner_id).distinct()]
+    query.delete(synchronize_session=False)
+    if planner_ids:
+        User.recount_unread_notifications(planner_ids)
+
+
 def send_sms(to_phone, message):
     """Send SMS via Twilio"""
     # Normalize phone number for Twilio (E.164 format)
@@ -329,67 +327,63 @@ def auth_signup():
     db.session.commit()
     
     # Auto-connect with anyone who has this user as a contact (invited them)
-    # Find contacts with matching phone number
-    new_user_phone_normalized = normalize_phone(data['phone_number'])
-    new_user_digits = re.sub(r'\D', '', data['phone_number'])[-10:] if data['phone_number'] else ''
-    
-    all_contacts = Contact.query.all()
-    for contact in all_contacts:
-        # Check if this contact matches the new user's phone
-        contact_normalized = normalize_phone(contact.phone_number)
-        contact_digits = re.sub(r'\D', '', contact.phone_number)[-10:] if contact.phone_number else ''
-        
-        if (contact.phone_number == data['phone_number'] or 
-            contact_normalized == new_user_phone_normalized or 
-            (contact_digits and contact_digits == new_user_digits)):
-            
-            inviter = User.query.get(contact.owner_id)
-            if inviter and inviter.id != user.id:
-                # Check if friendship doesn't already exist
-                existing_friendship = Friendship.query.filter(
-                    ((Friendship.user_id_1 == inviter.id) & (Friendship.user_id_2 == user.id)) |
-                    ((Friendship.user_id_1 == user.id) & (Friendship.user_id_2 == inviter.id))
-                ).first()
-                
-                if not existing_friendship:
-                    # Create mutual friendship
-                    friendship = Friendship(user_id_1=inviter.id, user_id_2=user.id)
-                    db.session.add(friendship)
-                    
-                    # Update the contact name to the user's actual name
-                    contact.name = user.name
-                    
-                    # Create reciprocal contact for new user
-                    reciprocal_exists = Contact.query.filter_by(
-                        owner_id=user.id,
-                        phone_number=inviter.phone_number
-                    ).first()
-                    
-                    if not reciprocal_exists:
-                        reciprocal_contact = Contact(
-                            owner_id=user.id,
-                            name=inviter.name,
-                            phone_number=inviter.phone_number
-                        )
-                        db.session.add(reciprocal_contact)
-                    
-                    # Notify the inviter
-                    notification = Notification(
-                        planner_id=inviter.id,
-                        contact_id=None,
-                        message=f"{user.name} joined Gatherly! You're now connected.",
-                        from_user_id=user.id
-                    )
-                    
-                    # Send push notification
-                    send_push_notification(
-                        inviter.id,
-                        user.name,
-                        'Joined Gatherly! You\'re now connected 🎉'
-                    )
-                    db.session.add(notification)
-                    
-                    print(f"[AUTO-CONNECT] {user.name} auto-connected with {inviter.name} (inviter)")
+    # Find contacts with a matching phone key (indexed lookup)
+    inviter_contacts = Contact.query.filter(
+        Contact.phone_key == user.phone_key,
+        Contact.owner_id != user.id
+    ).all() if user.phone_key else []
+    inviter_ids = {contact.owner_id for contact in inviter_contacts}
+    inviters = User.query.filter(User.id.in_(inviter_ids)).order_by(User.id).all() if inviter_ids else []
+    
+    if inviters:
+        # Update the contact names to the user's actual name
+        for contact in inviter_contacts:
+            contact.name = user.name
+        
+        # The user was just created, so there are no existing friendships or contacts to check.
+        # Create mutual friendships, reciprocal contacts and notifications as bulk inserts.
+        db.session.execute(db.insert(Friendship), [
+            {'user_id_1': min(inviter.id, user.id), 'user_id_2': max(inviter.id, user.id)}
+            for inviter in inviters
+        ])
+        
+        reciprocal_contacts = {}
+        for inviter in inviters:
+            reciprocal_contacts.setdefault(inviter.phone_key or inviter.phone_number, inviter)
+        db.session.execute(db.insert(Contact), [
+            {
+                'owner_id': user.id,
+                'name': inviter.name,
+                'phone_number': inviter.phone_number,
+                'phone_key': inviter.phone_key,
+                'display_order': order
+            }
+            for order, inviter in enumerate(reciprocal_contacts.values(), start=1)
+        ])
+        
+        bump_friends_version(inviter_ids)
+        FriendSlotCount.friendships_changed(user.id, inviter_ids, 1)
+        
+        # Notify the inviters
+        db.session.execute(db.insert(Notification), [
+            {
+                'planner_id': inviter.id,
+                'contact_id': None,
+                'message': f"{user.name} joined Gatherly! You're now connected.",
+                'from_user_id': user.id
+            }
+            for inviter in inviters
+        ])
+        User.add_unread_notifications(inviter_ids)
+        
+        for inviter in inviters:
+            # Send push notification
+            send_push_notification(
+                inviter.id,
+                user.name,
+                'Joined Gatherly! You\'re now connected 🎉'
+            )
+            print(f"[AUTO-CONNECT] {user.name} auto-connected with {inviter.name} (inviter)")
     
     db.session.commit()
     
@@ -553,6 +547,7 @@ def get_user(user_id):
         user.name = data.get('name', user.name)
         user.phone_number = data.get('phone_number', user.phone_number)
         user.timezone = data.get('timezone', user.timezone)
+        bump_friends_version(Friendship.friend_ids_select(user_id))
         db.session.commit()
         return jsonify(user.to_dict()), 200
     
@@ -564,11 +559,20 @@ def get_user(user_id):
             Notification.query.filter_by(planner_id=user_id).delete()
             print(f"[DELETE ACCOUNT] Deleted notifications")
             
+            # Take this user's slots out of their friends' heatmaps before the slots go
+            friend_ids = [row[0] for row in db.session.execute(Friendship.friend_ids_select(user_id))]
+            FriendSlotCount.friendships_changed(user_id, friend_ids, -1)
+            FriendSlotCount.query.filter_by(user_id=user_id).delete()
+            
             # Delete user availabilities
+            user.current_availability_id = None
+            db.session.flush()
+            UserAvailabilitySlot.query.filter_by(user_id=user_id).delete()
             UserAvailability.query.filter_by(user_id=user_id).delete()
             print(f"[DELETE ACCOUNT] Deleted user availabilities")
             
             # Delete friendships involving this user
+            bump_friends_version(friend_ids)
             Friendship.query.filter(
                 (Friendship.user_id_1 == user_id) | (Friendship.user_id_2 == user_id)
             ).delete(synchronize_session='fetch')
@@ -587,25 +591,17 @@ def get_user(user_id):
                     other_user.notification_friend_ids = [uid for uid in other_user.notification_friend_ids if uid != user_id]
             print(f"[DELETE ACCOUNT] Removed from notification lists")
             
-            # Delete contacts in OTHER users' lists that reference this user (by phone number)
-            user_phone = user.phone_number
-            user_phone_normalized = normalize_phone(user_phone)
-            user_digits = re.sub(r'\D', '', user_phone)[-10:] if user_phone else ''
-            
-            # Find all contacts that match this user's phone number
-            all_contacts = Contact.query.filter(Contact.owner_id != user_id).all()
-            for contact in all_contacts:
-                contact_normalized = normalize_phone(contact.phone_number)
-                contact_digits = re.sub(r'\D', '', contact.phone_number)[-10:] if contact.phone_number else ''
-                
-                if (contact.phone_number == user_phone or 
-                    contact_normalized == user_phone_normalized or 
-                    (contact_digits and contact_digits == user_digits)):
-                    # Delete related data first
-                    Notification.query.filter_by(contact_id=contact.id).delete()
-                    PlanGuest.query.filter_by(contact_id=contact.id).delete()
-                    Availability.query.filter_by(contact_id=contact.id).delete()
-                    db.session.delete(contact)
+            # Delete contacts in OTHER users' lists that reference this user (by phone key)
+            matching_contacts = Contact.query.filter(
+                Contact.owner_id != user_id,
+                Contact.phone_key == user.phone_key
+            ).all() if user.phone_key else []
+            for contact in matching_contacts:
+                # Delete related data first
+                delete_notifications(Notification.query.filter_by(contact_id=contact.id))
+                PlanGuest.query.filter_by(contact_id=contact.id).delete()
+                Availability.query.filter_by(contact_id=contact.id).delete()
+                db.session.delete(contact)
             print(f"[DELETE ACCOUNT] Deleted contacts from other users' lists")
             
             # Delete old-style availabilities where this user is the planner
@@ -655,7 +651,7 @@ def get_user(user_id):
                 HangoutMessage.query.filter_by(hangout_id=hangout.id).delete()
                 HangoutInvitee.query.filter_by(hangout_id=hangout.id).delete()
                 # Also delete notifications referencing this hangout
-                Notification.query.filter_by(hangout_id=hangout.id).delete()
+                delete_notifications(Notification.query.filter_by(hangout_id=hangout.id))
                 db.session.delete(hangout)
             print(f"[DELETE ACCOUNT] Deleted hangouts (as creator)")
             
@@ -748,18 +744,12 @@ def contacts():
         normalized_input = normalize_phone(input_phone)
         print(f"[ADD CONTACT] Attempting to add contact with phone: {input_phone} (normalized: {normalized_input})")
         
-        # Check if contact already exists for this owner (check both original and normalized)
+        # Check if contact already exists for this owner (matches any stored format)
+        input_key = phone_key(input_phone)
         existing_contact = Contact.query.filter_by(
             owner_id=data['owner_id'],
-            phone_number=normalized_input
-        ).first()
-        
-        # Also check for old non-normalized format
-        if not existing_contact:
-            existing_contact = Contact.query.filter_by(
-                owner_id=data['owner_id'],
-                phone_number=input_phone
-            ).first()
+            phone_key=input_key
+        ).first() if input_key else None
         
         if existing_contact:
             print(f"[ADD CONTACT] Contact already exists: {existing_contact.name}")
@@ -841,7 +831,139 @@ def contacts():
     
     # GET - fetch all contacts for this owner, sorted by display_order
     contacts = Contact.query.filter_by(owner_id=int(owner_id)).order_by(Contact.display_order).all()
-    return jsonify([c.to_dict() for c in contacts])
+    return jsonify(Contact.to_dict_list(contacts))
+
+
+MAX_CONTACT_IMPORT = 1000
+
+
+@app.route('/api/contacts/import', methods=['POST'])
+def import_contacts():
+    """Bulk-add contacts from a phone's address book"""
+    data = request.json or {}
+    owner_id = data.get('owner_id')
+    entries = data.get('contacts', [])
+    
+    if not owner_id:
+        return jsonify({'error': 'owner_id required'}), 400
+    
+    # Each entry is a phone number string or {'phone_number': str, 'name': str (optional)}
+    if not isinstance(entries, list):
+        return jsonify({'error': 'contacts must be a list'}), 400
+    for entry in entries:
+        if isinstance(entry, str):
+            continue
+        if not isinstance(entry, dict) or not all(
+            isinstance(entry.get(field) or '', str) for field in ('phone_number', 'name')
+        ):
+            return jsonify({'error': 'Each contact must be a phone number or an object with phone_number and name strings'}), 400
+    
+    if len(entries) > MAX_CONTACT_IMPORT:
+        return jsonify({'error': f'Too many contacts (max {MAX_CONTACT_IMPORT})'}), 400
+    
+    owner = db.session.get(User, int(owner_id))
+    if not owner:
+        return jsonify({'error': 'Owner not found'}), 404
+    
+    # Normalize and dedupe by phone key, skipping the owner's own number
+    entries_by_key = {}
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'phone_number': entry}
+        key = phone_key(entry.get('phone_number'))
+        if key and key != owner.phone_key:
+            entries_by_key.setdefault(key, entry)
+    
+    # Skip numbers the owner already has as contacts
+    existing_keys = set()
+    if entries_by_key:
+        existing_keys = {key for (key,) in db.session.query(Contact.phone_key).filter(
+            Contact.owner_id == owner.id,
+            Contact.phone_key.in_(entries_by_key.keys())
+        )}
+    new_keys = [key for key in entries_by_key if key not in existing_keys]
+    
+    # Match the remaining numbers to registered users in one query
+    users_by_key = {}
+    if new_keys:
+        for user in User.query.filter(User.phone_key.in_(new_keys)).order_by(User.id):
+            users_by_key.setdefault(user.phone_key, user)
+    
+    # Get max display_order for this owner to append new contacts at the end
+    max_order = db.session.query(db.func.max(Contact.display_order)).filter_by(owner_id=owner.id).scalar() or 0
+    
+    contact_rows = []
+    for order, key in enumerate(new_keys, start=max_order + 1):
+        entry = entries_by_key[key]
+        existing_user = users_by_key.get(key)
+        if existing_user:
+            # Use the platform user's name
+            contact_name = existing_user.name
+        elif (entry.get('name') or '').strip():
+            contact_name = entry['name'].strip()
+        else:
+            # Not on platform - use phone number as placeholder name
+            contact_name = entry['phone_number']
+        contact_rows.append({
+            'owner_id': owner.id,
+            'name': contact_name,
+            'phone_number': normalize_phone(entry['phone_number']),
+            'phone_key': key,
+            'display_order': order
+        })
+    if contact_rows:
+        db.session.execute(db.insert(Contact), contact_rows)
+    
+    # Send friend requests to matched users who aren't already friends or requested
+    matched_ids = {user.id for user in users_by_key.values()}
+    if matched_ids:
+        requested = FriendRequest.query.filter(
+            ((FriendRequest.from_user_id == owner.id) & FriendRequest.to_user_id.in_(matched_ids)) |
+            (FriendRequest.from_user_id.in_(matched_ids) & (FriendRequest.to_user_id == owner.id))
+        ).with_entities(FriendRequest.from_user_id, FriendRequest.to_user_id).all()
+        friends = Friendship.query.filter(
+            ((Friendship.user_id_1 == owner.id) & Friendship.user_id_2.in_(matched_ids)) |
+            (Friendship.user_id_1.in_(matched_ids) & (Friendship.user_id_2 == owner.id))
+        ).with_entities(Friendship.user_id_1, Friendship.user_id_2).all()
+        matched_ids -= {uid for pair in requested + friends for uid in pair}
+    recipients = [user for user in users_by_key.values() if user.id in matched_ids]
+    
+    if recipients:
+        db.session.execute(db.insert(FriendRequest), [
+            {'from_user_id': owner.id, 'to_user_id': recipient.id}
+            for recipient in recipients
+        ])
+        db.session.execute(db.insert(Notification), [
+            {'planner_id': owner.id, 'contact_id': None, 'message': f"Friend request sent to {recipient.name}"}
+            for recipient in recipients
+        ])
+        User.add_unread_notifications([owner.id], len(recipients))
+        
+        # Queue push notifications to the recipients for later delivery
+        queue_push_notifications(
+            [recipient.id for recipient in recipients],
+            owner.name,
+            'Sent you a friend request 👋',
+            '/#notifications'
+        )
+    
+    db.session.commit()
+    print(f"[IMPORT CONTACTS] {owner.name} imported {len(contact_rows)} contacts, sent {len(recipients)} friend requests")
+    
+    imported = Contact.query.filter(
+        Contact.owner_id == owner.id,
+        Contact.phone_key.in_(new_keys)
+    ).order_by(Contact.display_order).all() if new_keys else []
+    contacts_data = Contact.to_dict_list(imported)
+    for contact_data, contact in zip(contacts_data, imported):
+        contact_data['is_on_platform'] = contact.phone_key in users_by_key
+    
+    return jsonify({
+        'imported': len(contact_rows),
+        'skipped': len(entries) - len(contact_rows),
+        'friend_requests_sent': len(recipients),
+        'contacts': contacts_data
+    }), 201
 
 
 @app.route('/api/contacts/<int:contact_id>/invite', methods=['POST'])
@@ -924,10 +1046,13 @@ def delete_contact(contact_id):
         print(f"[DELETE] Deleting friendship between {owner_id} and {linked_user.id}")
         
         # Delete the friendship between owner and linked user
-        Friendship.query.filter(
+        deleted_friendships = Friendship.query.filter(
             ((Friendship.user_id_1 == owner_id) & (Friendship.user_id_2 == linked_user.id)) |
             ((Friendship.user_id_1 == linked_user.id) & (Friendship.user_id_2 == owner_id))
         ).delete()
+        if deleted_friendships:
+            bump_friends_version([owner_id, linked_user.id])
+            FriendSlotCount.friendships_changed(owner_id, [linked_user.id], -1)
         
         # Also delete any pending friend requests between them
         FriendRequest.query.filter(
@@ -938,25 +1063,16 @@ def delete_contact(contact_id):
         # Delete the reciprocal contact (the linked user's contact for the owner)
         # Need to find by normalized phone matching
         if owner:
-            # Find reciprocal contact using normalized phone matching
-            reciprocal_contact = None
-            owner_normalized = normalize_phone(owner.phone_number)
-            owner_digits = re.sub(r'\D', '', owner.phone_number)[-10:] if owner.phone_number else ''
-            
-            # Check all contacts owned by the linked user
-            linked_user_contacts = Contact.query.filter_by(owner_id=linked_user.id).all()
-            for c in linked_user_contacts:
-                c_normalized = normalize_phone(c.phone_number)
-                c_digits = re.sub(r'\D', '', c.phone_number)[-10:] if c.phone_number else ''
-                
-                if c.phone_number == owner.phone_number or c_normalized == owner_normalized or c_digits == owner_digits:
-                    reciprocal_contact = c
-                    break
+            # Find reciprocal contact by phone key
+            reciprocal_contact = Contact.query.filter_by(
+                owner_id=linked_user.id,
+                phone_key=owner.phone_key
+            ).first() if owner.phone_key else None
             
             if reciprocal_contact:
                 print(f"[DELETE] Found reciprocal contact {reciprocal_contact.id}, deleting...")
                 # Delete notifications for reciprocal contact
-                Notification.query.filter_by(contact_id=reciprocal_contact.id).delete()
+                delete_notifications(Notification.query.filter_by(contact_id=reciprocal_contact.id))
                 # Delete plan guests for reciprocal contact
                 PlanGuest.query.filter_by(contact_id=reciprocal_contact.id).delete()
                 # Delete availabilities for reciprocal contact
@@ -967,7 +1083,7 @@ def delete_contact(contact_id):
                 print(f"[DELETE] No reciprocal contact found for owner phone {owner.phone_number}")
     
     # Delete notifications for this contact (to avoid foreign key constraint)
-    Notification.query.filter_by(contact_id=contact_id).delete()
+    delete_notifications(Notification.query.filter_by(contact_id=contact_id))
     
     # Delete all plan guests associated with this contact
     PlanGuest.query.filter_by(contact_id=contact_id).delete()
@@ -1044,6 +1160,8 @@ def accept_friend_request(request_id):
     # Create the mutual friendship
     friendship = Friendship.create_friendship(friend_request.from_user_id, friend_request.to_user_id)
     db.session.add(friendship)
+    bump_friends_version([friend_request.from_user_id, friend_request.to_user_id])
+    FriendSlotCount.friendships_changed(friend_request.from_user_id, [friend_request.to_user_id], 1)
     
     # Create reciprocal contact for the accepting user (so they see the requester in their contacts)
     from_user = User.query.get(friend_request.from_user_id)
@@ -1120,37 +1238,171 @@ def get_friends():
     
     user_id = session['user_id']
     
-    # Find all friendships where user is either user_id_1 or user_id_2
-    friendships = Friendship.query.filter(
+    # Friend is active if their latest availability has a slot today or later
+    # Use yesterday as cutoff to handle timezone differences (server is UTC)
+    yesterday = date.today() - timedelta(days=1)
+    friend_id = db.case((Friendship.user_id_1 == user_id, Friendship.user_id_2), else_=Friendship.user_id_1)
+    rows = db.session.query(
+        User.id,
+        User.name,
+        User.phone_number,
+        Friendship.created_at,
+        (UserAvailability.last_slot_date >= yesterday).label('has_actual_availability')
+    ).select_from(Friendship).join(
+        User, User.id == friend_id
+    ).outerjoin(
+        UserAvailability, UserAvailability.id == User.current_availability_id
+    ).filter(
         (Friendship.user_id_1 == user_id) | (Friendship.user_id_2 == user_id)
     ).all()
     
-    friends = []
-    for f in friendships:
-        friend_id = f.user_id_2 if f.user_id_1 == user_id else f.user_id_1
-        friend = User.query.get(friend_id)
-        if friend:
-            # Check if friend has ACTUAL future availability saved
-            friend_availability = UserAvailability.query.filter_by(user_id=friend_id).order_by(UserAvailability.updated_at.desc()).first()
-            has_actual_availability = False
-            if friend_availability and friend_availability.time_slots:
-                # Only count slots that are today or in the future
-                # Use yesterday as cutoff to handle timezone differences (server is UTC)
-                yesterday_str = (date.today() - timedelta(days=1)).isoformat()
-                future_slots = [s for s in friend_availability.time_slots if s.get('date', '') >= yesterday_str]
-                has_actual_availability = len(future_slots) > 0
-            
-            friends.append({
-                'id': friend.id,
-                'name': friend.name,
-                'phone_number': friend.phone_number,
-                'is_active_this_week': has_actual_availability,
-                'friendship_created_at': f.created_at.isoformat()
-            })
+    friends = [{
+        'id': row.id,
+        'name': row.name,
+        'phone_number': row.phone_number,
+        'is_active_this_week': bool(row.has_actual_availability),
+        'friendship_created_at': row.created_at.isoformat()
+    } for row in rows]
     
     return jsonify(friends)
 
 
+@app.route('/api/friends/free', methods=['GET'])
+def get_friends_free_at_slot():
+    """Get the current user's friends who are free at a specific date/time slot"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    user_id = session['user_id']
+    date_str = request.args.get('date')
+    time_slot = request.args.get('time_slot')
+    
+    if not date_str or not time_slot:
+        return jsonify({'error': 'Date and time_slot are required'}), 400
+    
+    try:
+        slot_date = date.fromisoformat(date_str)
+    except ValueError:
+        return jsonify({'error': 'Invalid date'}), 400
+    
+    # Everyone free at this slot (date/slot index), intersected with the user's friends
+    free_friends = db.session.query(User.id, User.name).join(
+        UserAvailabilitySlot, UserAvailabilitySlot.user_id == User.id
+    ).filter(
+        UserAvailabilitySlot.date == slot_date,
+        UserAvailabilitySlot.slot == time_slot,
+        UserAvailabilitySlot.user_id.in_(Friendship.friend_ids_select(user_id))
+    ).order_by(User.name).all()
+    
+    return jsonify([{'user_id': friend.id, 'user_name': friend.name} for friend in free_friends])
+
+
+MAX_OVERLAP_DAYS = 62
+HEATMAP_MAX_DAYS = SLOT_MASK_DAYS  # Availability (and so the heatmap counts) only spans the slot mask window
+
+
+@app.route('/api/friends/heatmap', methods=['GET'])
+def get_friends_heatmap():
+    """How many of the current user's friends are free in each slot of a date range
+    
+    Returns counts as one row per day, one column per slot (in SLOT_NAMES order).
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    user_id = session['user_id']
+    
+    try:
+        start = date.fromisoformat(request.args['start_date']) if request.args.get('start_date') else date.today()
+        num_days = int(request.args.get('days', 14))
+    except ValueError:
+        return jsonify({'error': 'Invalid start_date or days'}), 400
+    
+    if num_days < 1 or num_days > HEATMAP_MAX_DAYS:
+        return jsonify({'error': f'days must be 1 to {HEATMAP_MAX_DAYS}'}), 400
+    
+    cells = db.session.query(FriendSlotCount.date, FriendSlotCount.slot, FriendSlotCount.free_count).filter(
+        FriendSlotCount.user_id == user_id,
+        FriendSlotCount.date >= start,
+        FriendSlotCount.date < start + timedelta(days=num_days)
+    ).all()
+    
+    counts = [[0] * len(SLOT_NAMES) for _ in range(num_days)]
+    for cell_date, slot_name, free_count in cells:
+        if slot_name in SLOT_NAMES:
+            counts[(cell_date - start).days][SLOT_NAMES.index(slot_name)] = free_count
+    
+    return jsonify({
+        'start_date': start.isoformat(),
+        'slots': SLOT_NAMES,
+        'counts': counts
+    })
+
+
+@app.route('/api/friends/overlap', methods=['GET'])
+def get_friends_overlap():
+    """Rank the slots in a date range by how many of the given friends (and the current user) are free"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    user_id = session['user_id']
+    
+    try:
+        requested_ids = {int(fid) for fid in request.args.get('friend_ids', '').split(',') if fid.strip()}
+        start = date.fromisoformat(request.args['start_date']) if request.args.get('start_date') else date.today()
+        end = date.fromisoformat(request.args['end_date']) if request.args.get('end_date') else start + timedelta(days=13)
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'error': 'Invalid friend_ids, start_date, end_date or limit'}), 400
+    
+    if not requested_ids:
+        return jsonify({'error': 'friend_ids required'}), 400
+    
+    num_days = (end - start).days + 1
+    if num_days < 1 or num_days > MAX_OVERLAP_DAYS:
+        return jsonify({'error': f'Date range must be 1 to {MAX_OVERLAP_DAYS} days'}), 400
+    
+    # Only include people who are actually friends (one query for the whole group)
+    friendships = Friendship.query.filter(
+        ((Friendship.user_id_1 == user_id) & Friendship.user_id_2.in_(requested_ids)) |
+        ((Friendship.user_id_2 == user_id) & Friendship.user_id_1.in_(requested_ids))
+    ).with_entities(Friendship.user_id_1, Friendship.user_id_2).all()
+    participant_ids = [user_id] + sorted({uid for pair in friendships for uid in pair} - {user_id})
+    
+    # Each participant's current slot mask, re-anchored to the start of the range
+    rows = UserAvailability.current_for(participant_ids).with_entities(
+        UserAvailability.user_id, UserAvailability.week_start_date, UserAvailability.slot_mask
+    ).all()
+    num_bits = num_days * len(SLOT_NAMES)
+    range_mask = (1 << num_bits) - 1
+    masks = {
+        row.user_id: shift_slot_mask(row.slot_mask or 0, row.week_start_date, start) & range_mask
+        for row in rows
+    }
+    
+    # Free count for every slot in the range, then rank the best ones
+    counts = slot_mask_counts(masks.values(), num_bits)
+    best_bits = sorted((bit for bit in range(num_bits) if counts[bit]), key=lambda bit: (-counts[bit], bit))[:limit]
+    
+    slots = []
+    for bit in best_bits:
+        day, slot_index = divmod(bit, len(SLOT_NAMES))
+        slots.append({
+            'date': (start + timedelta(days=day)).isoformat(),
+            'slot': SLOT_NAMES[slot_index],
+            'free_count': counts[bit],
+            'free_user_ids': [uid for uid in participant_ids if masks.get(uid, 0) >> bit & 1],
+            'everyone_free': counts[bit] == len(participant_ids)
+        })
+    
+    return jsonify({
+        'start_date': start.isoformat(),
+        'end_date': end.isoformat(),
+        'participant_ids': participant_ids,
+        'slots': slots
+    })
+
+
 @app.route('/api/nudge/<int:friend_user_id>', methods=['POST'])
 def send_nudge(friend_user_id):
     """Send a nudge to a friend asking them to share their availability"""
@@ -1167,15 +1419,12 @@ def send_nudge(friend_user_id):
     
     # Check if friend has ACTUAL availability saved for TODAY or FUTURE dates
     # Old availability from the past doesn't count
-    friend_availability = UserAvailability.query.filter_by(user_id=friend_user_id).order_by(UserAvailability.updated_at.desc()).first()
-    has_future_availability = False
-    if friend_availability and friend_availability.time_slots:
-        # Use yesterday as cutoff to handle timezone differences (server is UTC)
-        yesterday_str = (date.today() - timedelta(days=1)).isoformat()
-        for slot in friend_availability.time_slots:
-            if slot.get('date', '') >= yesterday_str:
-                has_future_availability = True
-                break
+    # Use yesterday as cutoff to handle timezone differences (server is UTC)
+    friend_availability = friend.current_availability
+    yesterday = date.today() - timedelta(days=1)
+    has_future_availability = bool(
+        friend_availability and friend_availability.last_slot_date and friend_availability.last_slot_date >= yesterday
+    )
     
     if has_future_availability:
         return jsonify({
@@ -1242,39 +1491,147 @@ def get_friends_availability():
     if not user.is_active_this_week():
         return jsonify({'error': 'You must save your availability to see friends\' availability', 'active': False}), 403
     
-    # Find all friendships
-    friendships = Friendship.query.filter(
-        (Friendship.user_id_1 == user_id) | (Friendship.user_id_2 == user_id)
-    ).all()
-    
-    friend_ids = []
-    for f in friendships:
-        friend_id = f.user_id_2 if f.user_id_1 == user_id else f.user_id_1
-        friend_ids.append(friend_id)
+    # The list only changes when friends_version is bumped or the day rolls over
+    etag = f"{user_id}-{user.friends_version or 0}-{date.today().isoformat()}"
+    if request.if_none_match.contains(etag):
+        response = app.make_response(('', 304))
+        response.set_etag(etag)
+        return response
     
-    # Get availability for all friends (only future slots)
+    # Get every friend's current availability that still has future slots, in one query
     # Use yesterday as cutoff to handle timezone differences (server is UTC)
-    yesterday_str = (date.today() - timedelta(days=1)).isoformat()
+    yesterday = date.today() - timedelta(days=1)
+    yesterday_str = yesterday.isoformat()
+    friend_availabilities = UserAvailability.current_for(
+        Friendship.friend_ids_select(user_id)
+    ).filter(
+        UserAvailability.last_slot_date >= yesterday
+    ).with_entities(UserAvailability, User.name).all()
+    
     availabilities = []
-    for friend_id in friend_ids:
-        friend = User.query.get(friend_id)
-        if friend:
-            # Get their most recent availability
-            avail = UserAvailability.query.filter_by(
-                user_id=friend_id
-            ).order_by(UserAvailability.updated_at.desc()).first()
-            if avail and avail.time_slots:
-                # Filter to only include future slots
-                future_slots = [s for s in avail.time_slots if s.get('date', '') >= yesterday_str]
-                if len(future_slots) > 0:
-                    availabilities.append({
-                        'user_id': friend.id,
-                        'user_name': friend.name,
-                        'time_slots': future_slots,
-                        'updated_at': avail.updated_at.isoformat()
-                    })
+    for avail, friend_name in friend_availabilities:
+        # Filter to only include future slots
+        future_slots = [s for s in avail.time_slots if s.get('date', '') >= yesterday_str]
+        if len(future_slots) > 0:
+            availabilities.append({
+                'user_id': avail.user_id,
+                'user_name': friend_name,
+                'time_slots': future_slots,
+                'updated_at': avail.updated_at.isoformat()
+            })
     
-    return jsonify({'active': True, 'availabilities': availabilities})
+    response = jsonify({'active': True, 'availabilities': availabilities})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def parse_time_slots(time_slots):
+    """Validate a client's list of {"date": "YYYY-MM-DD", "slot": <SLOT_NAMES>} entries
+    
+    Returns the entries with dates in canonical ISO form; raises ValueError on anything else.
+    """
+    if not isinstance(time_slots, list):
+        raise ValueError('time slots must be a list')
+    parsed = []
+    for slot in time_slots:
+        if not isinstance(slot, dict) or slot.get('slot') not in SLOT_NAMES or not isinstance(slot.get('date'), str):
+            raise ValueError('each time slot needs a date and a slot of ' + ', '.join(SLOT_NAMES))
+        parsed.append({'date': date.fromisoformat(slot['date']).isoformat(), 'slot': slot['slot']})
+    return parsed
+
+
+def save_my_availability(user, time_slots):
+    """Replace a user's current availability with time_slots
+    
+    Diffs against the current availability's slot mask, keeps the slot index and
+    pending notification delta in sync, and bumps the version. Caller commits.
+    Returns (availability, added_slots, removed_slots).
+    """
+    # Get current week's Monday
+    today = datetime.utcnow().date()
+    monday = today - timedelta(days=today.weekday())
+    
+    # The current availability is this week's row unless the week has rolled over
+    # Compare against it (re-anchored to this week) so a new week doesn't look like all-new slots
+    old_mask = 0
+    most_recent_availability = user.current_availability
+    if most_recent_availability:
+        old_mask = shift_slot_mask(most_recent_availability.slot_mask or 0, most_recent_availability.week_start_date, monday)
+    
+    if most_recent_availability and most_recent_availability.week_start_date == monday:
+        availability = most_recent_availability
+    else:
+        availability = UserAvailability.query.filter_by(
+            user_id=user.id,
+            week_start_date=monday
+        ).first()
+    
+    # Diff the slot masks to find what was added and removed
+    new_mask = encode_slot_mask(time_slots, monday)
+    added_mask = new_mask & ~old_mask
+    removed_mask = old_mask & ~new_mask
+    
+    if availability:
+        # Update existing
+        availability.set_time_slots(time_slots)
+        availability.updated_at = datetime.utcnow()
+    else:
+        # Create new
+        availability = UserAvailability(
+            user_id=user.id,
+            week_start_date=monday
+        )
+        availability.set_time_slots(time_slots)
+        db.session.add(availability)
+    # Versions keep counting up across weeks so a client's token never matches a different row
+    versions = [a.version or 0 for a in (availability, most_recent_availability) if a]
+    availability.version = max(versions) + 1
+    user.current_availability = availability
+    
+    added_slots, removed_slots = UserAvailabilitySlot.sync_for_user(user.id, time_slots, monday)
+    
+    # Update user's weekly_availability_date to today - they're "active" for 7 days
+    user.weekly_availability_date = today
+    
+    # Invalidate friends' cached availability and shift their heatmap counts by what changed
+    # Sorted so concurrent saves by mutual friends lock the same rows in the same order
+    friend_ids = sorted(row[0] for row in db.session.execute(Friendship.friend_ids_select(user.id)))
+    bump_friends_version(friend_ids)
+    slot_changes = {key: 1 for key in added_slots}
+    slot_changes.update({key: -1 for key in removed_slots})
+    FriendSlotCount.adjust(friend_ids, slot_changes)
+    
+    # Accumulate added slots for the notification cron; slots removed again before it runs are dropped
+    # Notifications are aggregated and sent after a delay by send_availability_notifications.py
+    pending_mask = 0
+    if user.availability_notification_pending and user.pending_slot_week:
+        pending_mask = shift_slot_mask(user.pending_slot_mask or 0, user.pending_slot_week, monday)
+    pending_mask = (pending_mask | added_mask) & new_mask
+    if added_mask:
+        user.availability_updated_at = datetime.utcnow()
+    user.availability_notification_pending = pending_mask != 0
+    user.pending_slot_mask = pending_mask
+    user.pending_slot_week = monday
+    
+    return availability, decode_slot_mask(added_mask, monday), decode_slot_mask(removed_mask, monday)
+
+
+def my_availability_response(user, availability, added_slots, removed_slots):
+    """Log a save and build the response shared by POST and PATCH /api/my-availability"""
+    today = datetime.utcnow().date()
+    print(f"[AVAILABILITY] {user.name} saved availability with {len(availability.time_slots)} slots, active until {today + timedelta(days=7)}")
+    print(f"[AVAILABILITY] Slots added: {len(added_slots)}, removed: {len(removed_slots)}, notification pending: {user.availability_notification_pending}")
+    
+    return jsonify({
+        'message': 'Availability saved',
+        'availability': availability.to_dict(),
+        'version': availability.version,
+        'added': added_slots,
+        'removed': removed_slots,
+        'is_active': True,
+        'days_remaining': 7
+    })
 
 
 @app.route('/api/my-availability', methods=['GET', 'POST'])
@@ -1286,76 +1643,19 @@ def my_availability():
     user_id = session['user_id']
     user = User.query.get(user_id)
     
-    # Get current week's Monday
     today = datetime.utcnow().date()
-    monday = today - timedelta(days=today.weekday())
     
     if request.method == 'POST':
-        data = request.json
-        time_slots = data.get('time_slots', [])
-        
-        # Find or create availability for this week
-        availability = UserAvailability.query.filter_by(
-            user_id=user_id,
-            week_start_date=monday
-        ).first()
-        
-        # Check if there are NEW slots being added (for notifications)
-        # Get the MOST RECENT availability (regardless of week) to compare against
-        # This prevents false "new" notifications when the week changes
-        old_slots = set()
-        most_recent_availability = UserAvailability.query.filter_by(
-            user_id=user_id
-        ).order_by(UserAvailability.updated_at.desc()).first()
-        
-        if most_recent_availability:
-            # Get existing slots as a set for comparison
-            for slot in most_recent_availability.time_slots:
-                old_slots.add(f"{slot['date']}_{slot['slot']}")
-        
-        new_slots = set()
-        for slot in time_slots:
-            new_slots.add(f"{slot['date']}_{slot['slot']}")
-        
-        # Check if any genuinely new slots were added
-        added_slots = new_slots - old_slots
-        has_new_availability = len(added_slots) > 0
-        
-        if availability:
-            # Update existing
-            availability.time_slots = time_slots
-            availability.updated_at = datetime.utcnow()
-        else:
-            # Create new
-            availability = UserAvailability(
-                user_id=user_id,
-                week_start_date=monday,
-                time_slots=time_slots
-            )
-            db.session.add(availability)
-        
-        # Update user's weekly_availability_date to today - they're "active" for 7 days
-        user.weekly_availability_date = today
+        data = request.json or {}
+        try:
+            time_slots = parse_time_slots(data.get('time_slots', []))
+        except ValueError as e:
+            return jsonify({'error': f'Invalid time_slots: {e}'}), 400
         
+        availability, added_slots, removed_slots = save_my_availability(user, time_slots)
         db.session.commit()
         
-        print(f"[AVAILABILITY] {user.name} saved availability with {len(time_slots)} slots, active until {today + timedelta(days=7)}")
-        print(f"[AVAILABILITY] New slots added: {len(added_slots)}, will notify: {has_new_availability}")
-        
-        # Only mark notification as pending if NEW availability was added (not just removed)
-        # Notifications are aggregated and sent after 5 minutes by a cron job
-        if has_new_availability:
-            user.availability_notification_pending = True
-            user.availability_updated_at = datetime.utcnow()
-            db.session.commit()
-            print(f"[AVAILABILITY] Marked notification as pending for {user.name}")
-        
-        return jsonify({
-            'message': 'Availability saved',
-            'availability': availability.to_dict(),
-            'is_active': True,
-            'days_remaining': 7
-        })
+        return my_availability_response(user, availability, added_slots, removed_slots)
     
     # GET - return user's availability (get most recent)
     # Calculate days remaining based on when they last saved
@@ -1367,9 +1667,7 @@ def my_availability():
         is_active = days_remaining > 0
     
     # Get the most recent availability for this user
-    availability = UserAvailability.query.filter_by(
-        user_id=user_id
-    ).order_by(UserAvailability.updated_at.desc()).first()
+    availability = user.current_availability
     
     return jsonify({
         'availability': availability.to_dict() if availability else None,
@@ -1378,6 +1676,65 @@ def my_availability():
     })
 
 
+@app.route('/api/my-availability', methods=['PATCH'])
+def patch_my_availability():
+    """Apply added/removed slots to the current user's availability
+    
+    Body: {"added": [{"date", "slot"}, ...], "removed": [...], "version": <optional>}
+    If version is given and doesn't match the current availability, nothing is
+    applied and 409 is returned with the current availability.
+    
+    The delta only shrinks the request: the merged list is saved like a POST, so the
+    row's time_slots JSON and slot_mask are rewritten (slot rows only where they changed).
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    data = request.json or {}
+    try:
+        added = parse_time_slots(data.get('added', []))
+        removed = parse_time_slots(data.get('removed', []))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid added or removed slots: {e}'}), 400
+    
+    version = data.get('version')
+    if version is not None:
+        try:
+            version = int(version)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'version must be an integer'}), 400
+    
+    # Lock the user row so concurrent deltas from the same user apply one at a time
+    user = User.query.filter_by(id=session['user_id']).with_for_update().first()
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    current = user.current_availability
+    current_version = (current.version or 0) if current else 0
+    if version is not None and version != current_version:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Availability changed since it was loaded',
+            'availability': current.to_dict() if current else None,
+            'version': current_version
+        }), 409
+    
+    # Apply the delta to the current slot list, keeping its order
+    removed_keys = {(s['date'], s['slot']) for s in removed}
+    time_slots = [s for s in (current.time_slots if current else []) if (s.get('date'), s.get('slot')) not in removed_keys]
+    existing_keys = {(s.get('date'), s.get('slot')) for s in time_slots}
+    for slot in added:
+        key = (slot['date'], slot['slot'])
+        if key not in existing_keys:
+            time_slots.append(slot)
+            existing_keys.add(key)
+    
+    availability, added_slots, removed_slots = save_my_availability(user, time_slots)
+    db.session.commit()
+    
+    return my_availability_response(user, availability, added_slots, removed_slots)
+
+
 # API Routes - Plans
 @app.route('/api/plans', methods=['POST'])
 def create_plan():
@@ -1425,9 +1782,9 @@ def create_plan():
         availability = Availability(
             week_start_date=week_start,
             planner_id=planner.id,
-            contact_id=None,  # Planner's own availability
-            time_slots=data['planner_availability']
+            contact_id=None  # Planner's own availability
         )
+        availability.set_time_slots(data['planner_availability'])
         db.session.add(availability)
         print(f"[DEBUG] Created new availability with {len(data['planner_availability'])} slots")
     
@@ -1545,7 +1902,7 @@ def submit_availability():
         guest_message = data.get('message', '').strip()
         
         if availability:
-            availability.time_slots = data['time_slots']
+            availability.set_time_slots(data['time_slots'])
             availability.message = guest_message if guest_message else None
             availability.updated_at = datetime.utcnow()
         else:
@@ -1553,9 +1910,9 @@ def submit_availability():
                 week_start_date=plan.week_start_date,
                 planner_id=plan.planner_id,
                 contact_id=plan_guest.contact_id,
-                time_slots=data['time_slots'],
                 message=guest_message if guest_message else None
             )
+            availability.set_time_slots(data['time_slots'])
             db.session.add(availability)
         
         plan_guest.has_responded = True
@@ -1659,24 +2016,30 @@ def get_availability_by_daterange():
     start = datetime.fromisoformat(start_date).date()
     end = datetime.fromisoformat(end_date).date()
     
-    # Get all availability for this planner
-    all_avails = Availability.query.filter_by(planner_id=int(planner_id)).all()
+    # Find the slots in the date range with one indexed query
+    slots = db.session.query(
+        AvailabilitySlot.availability_id, AvailabilitySlot.date, AvailabilitySlot.slot
+    ).filter(
+        AvailabilitySlot.planner_id == int(planner_id),
+        AvailabilitySlot.date >= start,
+        AvailabilitySlot.date <= end
+    ).order_by(AvailabilitySlot.date, AvailabilitySlot.id).all()
+    
+    matching_slots = {}
+    for availability_id, slot_date, slot_name in slots:
+        matching_slots.setdefault(availability_id, []).append({'date': slot_date.isoformat(), 'slot': slot_name})
+    
+    # Load only the availability records that have slots in the range
+    avails = Availability.query.filter(
+        Availability.id.in_(matching_slots.keys())
+    ).order_by(Availability.id).all() if matching_slots else []
     
-    # Filter to only include availability with time_slots in the date range
     filtered_avails = []
-    for avail in all_avails:
-        matching_slots = []
-        for slot in avail.time_slots:
-            if 'date' in slot:
-                slot_date = datetime.fromisoformat(slot['date']).date()
-                if start <= slot_date <= end:
-                    matching_slots.append(slot)
-        
-        if matching_slots:
-            # Create a copy with only matching slots
-            avail_dict = avail.to_dict()
-            avail_dict['time_slots'] = matching_slots
-            filtered_avails.append(avail_dict)
+    for avail in avails:
+        # Create a copy with only matching slots
+        avail_dict = avail.to_dict()
+        avail_dict['time_slots'] = matching_slots[avail.id]
+        filtered_avails.append(avail_dict)
     
     return jsonify(filtered_avails)
 
@@ -1775,21 +2138,279 @@ def admin_all_availability():
 
 
 # Notifications API
+NOTIFICATIONS_PAGE_SIZE = 50
+MAX_NOTIFICATIONS_PAGE_SIZE = 100
+# Ids are handed out before commit, so a row can become visible after higher ids were already
+# read. Anything newer than this is re-checked by since_id and the event stream.
+LATE_COMMIT_SECONDS = 30
+
 @app.route('/api/notifications/<int:planner_id>', methods=['GET'])
 def get_notifications(planner_id):
-    """Get all notifications for a planner"""
-    notifications = Notification.query.filter_by(planner_id=planner_id).order_by(Notification.created_at.desc()).all()
-    return jsonify([n.to_dict() for n in notifications])
+    """Get notifications for a planner, newest first
+    
+    With no query parameters, returns the full list (legacy clients).
+    With limit, before_id or since_id, returns one page plus the unread count:
+      - before_id: notifications older than this id (next page when scrolling back)
+      - since_id: notifications newer than this id (polling for new ones), plus any created in
+        the last LATE_COMMIT_SECONDS in case they committed late; clients dedupe by id
+    """
+    if not any(key in request.args for key in ('limit', 'before_id', 'since_id')):
+        notifications = Notification.query.filter_by(planner_id=planner_id).order_by(Notification.created_at.desc()).all()
+        return jsonify(Notification.to_dict_list(notifications))
+    
+    try:
+        limit = min(int(request.args.get('limit', NOTIFICATIONS_PAGE_SIZE)), MAX_NOTIFICATIONS_PAGE_SIZE)
+        before_id = int(request.args['before_id']) if request.args.get('before_id') else None
+        since_id = int(request.args['since_id']) if request.args.get('since_id') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid limit, before_id or since_id'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be at least 1'}), 400
+    
+    query = Notification.query.filter(Notification.planner_id == planner_id)
+    if before_id is not None:
+        query = query.filter(Notification.id < before_id)
+    if since_id is not None:
+        late_cutoff = datetime.utcnow() - timedelta(seconds=LATE_COMMIT_SECONDS)
+        query = query.filter(db.or_(Notification.id > since_id, Notification.created_at >= late_cutoff))
+    
+    # Fetch one extra row to know whether there's more beyond this page
+    notifications = query.order_by(Notification.id.desc()).limit(limit + 1).all()
+    has_more = len(notifications) > limit
+    notifications = notifications[:limit]
+    
+    user = db.session.get(User, planner_id)
+    unread_count = (user.unread_notification_count or 0) if user else 0
+    
+    return jsonify({
+        'notifications': Notification.to_dict_list(notifications),
+        'unread_count': unread_count,
+        'has_more': has_more,
+        'next_before_id': notifications[-1].id if has_more else None
+    })
 
 
 @app.route('/api/notifications/<int:planner_id>/mark-read', methods=['POST'])
 def mark_notifications_read(planner_id):
     """Mark all notifications as read for a planner"""
     Notification.query.filter_by(planner_id=planner_id, read=False).update({'read': True})
+    User.query.filter_by(id=planner_id).update({User.unread_notification_count: 0})
     db.session.commit()
     return jsonify({'message': 'Notifications marked as read'}), 200
 
 
+@app.route('/api/notifications/<int:planner_id>/unread-count', methods=['GET'])
+def get_unread_notification_count(planner_id):
+    """Number of unread notifications, for the badge"""
+    user = db.session.get(User, planner_id)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    return jsonify({'unread_count': user.unread_notification_count or 0})
+
+
+# ============================================
+# LIVE EVENTS (Server-Sent Events)
+# ============================================
+
+EVENT_POLL_SECONDS = 2  # How often each process checks the database for rows written elsewhere
+EVENT_KEEPALIVE_SECONDS = 25  # Comment sent on idle streams so proxies don't drop them
+EVENT_STREAM_SECONDS = 600  # Close streams after this long; EventSource reconnects with Last-Event-ID
+
+
+class RecentIds:
+    """Ids seen in the last LATE_COMMIT_SECONDS, above a floor of ids that are settled
+    
+    A transaction can commit after one holding a higher id, so rather than a strict
+    high-water mark, polls re-scan from the floor (the newest id first seen longer ago
+    than LATE_COMMIT_SECONDS) and this set filters out the ones already delivered.
+    """
+    
+    def __init__(self, floor=0):
+        self.floor = floor
+        self.seen = {}  # id -> when it was first seen
+    
+    def add_new(self, ids):
+        """Record ids and return the ones not seen before"""
+        now = time.time()
+        new_ids = [item_id for item_id in ids if item_id not in self.seen]
+        for item_id in new_ids:
+            self.seen[item_id] = now
+        settled_before = now - LATE_COMMIT_SECONDS
+        for item_id, seen_at in list(self.seen.items()):
+            if seen_at < settled_before:
+                self.floor = max(self.floor, item_id)
+                del self.seen[item_id]
+        return set(new_ids)
+
+
+class EventBroker:
+    """Fans new notifications and friend requests out to this process's open event streams
+    
+    One background thread per process looks for rows past the ones it has seen (see RecentIds),
+    so idle streams cost one query per EVENT_POLL_SECONDS in total rather than one per client.
+    Commits in this process wake it immediately; rows written by other workers and
+    cron jobs are picked up on the next poll.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}  # user_id -> set of queue.Queue
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.notifications = RecentIds()
+        self.friend_requests = RecentIds()
+    
+    def subscribe(self, user_id):
+        """Register a stream for user_id's events (call inside an app context)"""
+        events = queue.Queue()
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(events)
+            if self.thread is None:
+                # Start from whatever exists now; streams catch up on their own from Last-Event-ID
+                self.notifications = RecentIds(db.session.query(db.func.max(Notification.id)).scalar() or 0)
+                self.friend_requests = RecentIds(db.session.query(db.func.max(FriendRequest.id)).scalar() or 0)
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+        return events
+    
+    def unsubscribe(self, user_id, events):
+        with self.lock:
+            user_queues = self.subscribers.get(user_id)
+            if user_queues:
+                user_queues.discard(events)
+                if not user_queues:
+                    del self.subscribers[user_id]
+    
+    def notify(self):
+        """Something may have been written - poll now rather than at the next interval"""
+        if self.subscribers:
+            self.wakeup.set()
+    
+    def run(self):
+        while True:
+            self.wakeup.wait(EVENT_POLL_SECONDS)
+            self.wakeup.clear()
+            if not self.subscribers:
+                continue
+            try:
+                with app.app_context():
+                    self.poll()
+                    db.session.remove()
+            except Exception as e:
+                print(f"[EVENTS] Poll failed: {e}")
+    
+    def poll(self):
+        notifications = db.session.query(Notification.id, Notification.planner_id).filter(
+            Notification.id > self.notifications.floor
+        ).order_by(Notification.id).all()
+        friend_requests = db.session.query(FriendRequest.id, FriendRequest.to_user_id).filter(
+            FriendRequest.id > self.friend_requests.floor
+        ).order_by(FriendRequest.id).all()
+        
+        new_notification_ids = self.notifications.add_new([row.id for row in notifications])
+        new_friend_request_ids = self.friend_requests.add_new([row.id for row in friend_requests])
+        
+        with self.lock:
+            for notification_id, user_id in notifications:
+                if notification_id in new_notification_ids:
+                    for events in self.subscribers.get(user_id, ()):
+                        events.put(('notification', notification_id))
+            for request_id, user_id in friend_requests:
+                if request_id in new_friend_request_ids:
+                    for events in self.subscribers.get(user_id, ()):
+                        events.put(('friend_request', request_id))
+
+
+event_broker = EventBroker()
+
+@event.listens_for(db.session, 'after_commit')
+def wake_event_broker(session):
+    event_broker.notify()
+
+
+def parse_event_cursor(value):
+    """Parse a "<notification id>-<friend request id>" event id, or None if malformed"""
+    try:
+        notification_id, friend_request_id = (int(part) for part in value.split('-'))
+    except (AttributeError, ValueError):
+        return None
+    return notification_id, friend_request_id
+
+
+@app.route('/api/events/stream', methods=['GET'])
+def event_stream():
+    """Stream new notifications and friend requests for the current user as Server-Sent Events
+    
+    Each event's id is "<notification id>-<friend request id>" - the newest of each delivered
+    so far - so a reconnecting EventSource resumes from Last-Event-ID. Resuming also replays
+    rows from the last LATE_COMMIT_SECONDS, which may have committed below those ids.
+    """
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    user_id = session['user_id']
+    cursor = parse_event_cursor(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    
+    # Subscribe before catching up so nothing written in between is missed (duplicates are skipped)
+    events = event_broker.subscribe(user_id)
+    
+    if cursor is None:
+        # Fresh connection: the client has just loaded everything, so start from the newest rows
+        cursor = (
+            db.session.query(db.func.max(Notification.id)).filter(Notification.planner_id == user_id).scalar() or 0,
+            db.session.query(db.func.max(FriendRequest.id)).filter(FriendRequest.to_user_id == user_id).scalar() or 0
+        )
+        missed = []
+    else:
+        late_cutoff = datetime.utcnow() - timedelta(seconds=LATE_COMMIT_SECONDS)
+        missed = [('notification', row.id) for row in db.session.query(Notification.id).filter(
+            Notification.planner_id == user_id,
+            db.or_(Notification.id > cursor[0], Notification.created_at >= late_cutoff)
+        ).order_by(Notification.id).limit(NOTIFICATIONS_PAGE_SIZE)]
+        missed += [('friend_request', row.id) for row in db.session.query(FriendRequest.id).filter(
+            FriendRequest.to_user_id == user_id,
+            db.or_(FriendRequest.id > cursor[1], FriendRequest.created_at >= late_cutoff)
+        ).order_by(FriendRequest.id).limit(NOTIFICATIONS_PAGE_SIZE)]
+    # Don't hold a database connection for the life of the stream
+    db.session.remove()
+    
+    def generate():
+        notification_id, friend_request_id = cursor
+        try:
+            yield 'retry: 5000\n\n'
+            yield f'id: {notification_id}-{friend_request_id}\nevent: ready\ndata: {{}}\n\n'
+            
+            pending = list(missed)
+            delivered = set()
+            deadline = time.time() + EVENT_STREAM_SECONDS
+            while time.time() < deadline:
+                if pending:
+                    kind, item_id = pending.pop(0)
+                else:
+                    try:
+                        kind, item_id = events.get(timeout=EVENT_KEEPALIVE_SECONDS)
+                    except queue.Empty:
+                        yield ': keepalive\n\n'
+                        continue
+                
+                # Catch-up and the broker can both report a row
+                if (kind, item_id) in delivered:
+                    continue
+                delivered.add((kind, item_id))
+                if kind == 'notification':
+                    notification_id = max(notification_id, item_id)
+                else:
+                    friend_request_id = max(friend_request_id, item_id)
+                yield f'id: {notification_id}-{friend_request_id}\nevent: {kind}\ndata: {json.dumps({"id": item_id})}\n\n'
+        finally:
+            event_broker.unsubscribe(user_id, events)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
 # ============================================
 # HANGOUT API ENDPOINTS
 # ============================================
@@ -1955,7 +2576,10 @@ def respond_to_hangout(hangout_id):
         hangout.creator_id,
         user.name,
         f'{response_text.capitalize()} your {day_name} invite {emoji}',
-        f'/?openPlan={hangout.id}'
+        f'/?openPlan={hangout.id}',
+        coalesce_key=f'hangout:{hangout.id}:responses',
+        summary_title=hangout_label(hangout),
+        summary_body='{count} new responses to your invite'
     )
     
     db.session.commit()
@@ -2214,7 +2838,7 @@ def delete_hangout(hangout_id):
     HangoutMessage.query.filter_by(hangout_id=hangout_id).delete()
     
     # Delete associated notifications
-    Notification.query.filter_by(hangout_id=hangout_id).delete()
+    delete_notifications(Notification.query.filter_by(hangout_id=hangout_id))
     
     # Delete the hangout (cascade will delete invitees)
     db.session.delete(hangout)
@@ -2347,8 +2971,12 @@ def send_hangout_message(hangout_id):
                 participant_id,
                 f'💬 {user.name}',
                 f'{message_text[:100]}{"..." if len(message_text) > 100 else ""}',
-                f'/?openPlan={hangout_id}'
+                f'/?openPlan={hangout_id}',
+                coalesce_key=f'hangout:{hangout_id}:messages',
+                summary_title=f'💬 {hangout_label(hangout)}',
+                summary_body='{count} new messages'
             )
+    db.session.commit()
     
     return jsonify(message.to_dict()), 201
 
@@ -2810,65 +3438,152 @@ Do NOT use markdown formatting (no asterisks, no bold, no headers)."""
 # Push Notification Endpoints
 # =====================
 
-def send_push_notification(user_id, title, body, url=None, notification_id=None):
-    """Send push notification to all subscriptions for a user"""
+PUSH_COALESCE_SECONDS = int(os.getenv('PUSH_COALESCE_SECONDS', '60'))  # Burst window for pushes sharing a coalesce_key
+
+def send_push_notification(user_id, title, body, url=None, notification_id=None,
+                           coalesce_key=None, summary_title=None, summary_body=None):
+    """Queue a push notification to all of a user's subscriptions
+    
+    Delivery happens in send_queued_pushes.py; the push is durable once the caller commits.
+    Returns whether the user has any subscription to deliver to, so callers can fall back to SMS.
+    
+    Pushes with a coalesce_key (e.g. one hangout's chat) go out immediately the first time.
+    Further ones within PUSH_COALESCE_SECONDS are held back and merged into a single push,
+    shown with summary_title and summary_body (e.g. '{count} new messages').
+    """
     if not VAPID_PUBLIC_KEY or not VAPID_PRIVATE_KEY:
         print("[PUSH] VAPID keys not configured, skipping push notification")
         return False
     
+    has_subscription = db.session.query(PushSubscription.query.filter_by(user_id=user_id).exists()).scalar()
+    if not has_subscription:
+        print(f"[PUSH] No subscriptions for user {user_id}")
+        return False
+    
+    deliver_after = None
+    if coalesce_key:
+        # Merge into a held-back push for the same key (never into the first of a burst,
+        # which has no next_attempt_at and must go out as-is). The merged push opens the
+        # latest event: the newest chat message, or the plan for RSVPs (same url for the key).
+        merged = QueuedPush.query.filter(
+            QueuedPush.user_id == user_id,
+            QueuedPush.coalesce_key == coalesce_key,
+            QueuedPush.status == 'pending',
+            QueuedPush.attempts == 0,
+            QueuedPush.next_attempt_at.isnot(None)
+        ).update({
+            QueuedPush.coalesce_count: db.func.coalesce(QueuedPush.coalesce_count, 1) + 1,
+            QueuedPush.title: title,
+            QueuedPush.body: body,
+            QueuedPush.url: url,
+            QueuedPush.notification_id: notification_id
+        }, synchronize_session=False)
+        if merged:
+            print(f"[PUSH] Merged into queued push for user {user_id} ({coalesce_key})")
+            return True
+        
+        # One went out recently - hold this one back so the rest of the burst merges into it
+        window_start = datetime.utcnow() - timedelta(seconds=PUSH_COALESCE_SECONDS)
+        recently_sent = db.session.query(QueuedPush.query.filter(
+            QueuedPush.user_id == user_id,
+            QueuedPush.coalesce_key == coalesce_key,
+            QueuedPush.created_at >= window_start
+        ).exists()).scalar()
+        if recently_sent:
+            deliver_after = datetime.utcnow() + timedelta(seconds=PUSH_COALESCE_SECONDS)
+    
+    db.session.add(QueuedPush(
+        user_id=user_id,
+        title=title,
+        body=body,
+        url=url,
+        notification_id=notification_id,
+        coalesce_key=coalesce_key,
+        summary_title=summary_title,
+        summary_body=summary_body,
+        next_attempt_at=deliver_after
+    ))
+    print(f"[PUSH] Queued for user {user_id}")
+    return True
+
+
+def deliver_push(push):
+    """Send a queued push to every subscription of its user
+    
+    Returns (delivered, error) - delivered is True if at least one subscription accepted it.
+    """
+    if not VAPID_PUBLIC_KEY or not VAPID_PRIVATE_KEY:
+        return False, 'VAPID keys not configured'
+    
     try:
-        from pywebpush import webpush
+        from push_client import get_push_client
     except ImportError:
-        print("[PUSH] pywebpush not installed")
-        return False
+        return False, 'pywebpush not installed'
     
-    subscriptions = PushSubscription.query.filter_by(user_id=user_id).all()
+    subscriptions = PushSubscription.query.filter_by(user_id=push.user_id).all()
     if not subscriptions:
-        print(f"[PUSH] No subscriptions for user {user_id}")
-        return False
+        return False, 'No subscriptions'
+    
+    title, body = push.title, push.body
+    if (push.coalesce_count or 1) > 1:
+        title = push.summary_title or title
+        body = push.summary_body.format(count=push.coalesce_count) if push.summary_body else body
     
     payload = json.dumps({
         'title': title,
         'body': body,
-        'url': url or '/#notifications',
-        'notificationId': notification_id
+        'url': push.url or '/#notifications',
+        'notificationId': push.notification_id
     })
     
-    # VAPID claims with the required 'sub' claim
-    vapid_claims = {
-        'sub': f'mailto:{VAPID_EMAIL}'
-    }
+    # Shared client: key parsed once, VAPID header and connections reused per push service
+    client = get_push_client(VAPID_PRIVATE_KEY, VAPID_EMAIL)
     
     success_count = 0
+    errors = []
     for sub in subscriptions:
         try:
-            # Use the raw private key string directly
-            webpush(
-                subscription_info={
+            client.send(
+                {
                     'endpoint': sub.endpoint,
                     'keys': {
                         'p256dh': sub.p256dh_key,
                         'auth': sub.auth_key
                     }
                 },
-                data=payload,
-                vapid_private_key=VAPID_PRIVATE_KEY,
-                vapid_claims=vapid_claims
+                payload
             )
             success_count += 1
-            print(f"[PUSH] Sent to user {user_id}")
+            print(f"[PUSH] Sent to user {push.user_id}")
         except Exception as e:
             error_msg = str(e)
-            print(f"[PUSH] Error sending to user {user_id}: {error_msg}")
-            import traceback
-            traceback.print_exc()
+            errors.append(error_msg)
+            print(f"[PUSH] Error sending to user {push.user_id}: {error_msg}")
             # Remove invalid subscriptions (410 Gone or 404 Not Found)
             if '410' in error_msg or '404' in error_msg:
                 print(f"[PUSH] Removing invalid subscription {sub.id}")
-                db.session.delete(sub)
-                db.session.commit()
+                # Query delete: another sender thread may have removed it already
+                PushSubscription.query.filter_by(id=sub.id).delete(synchronize_session=False)
     
-    return success_count > 0
+    return success_count > 0, '; '.join(errors)[:500] or None
+
+
+def hangout_label(hangout):
+    """Short name for a hangout in push summaries, e.g. 'Friday dinner' or 'Fri evening plan'"""
+    if hangout.description:
+        return hangout.description[:40]
+    day = datetime.strptime(hangout.date, '%Y-%m-%d').strftime('%a')
+    return f"{day} {hangout.time_slot.lower()} plan"
+
+
+def queue_push_notifications(user_ids, title, body, url=None):
+    """Queue the same push notification for several users in one insert (no subscription check)"""
+    if not user_ids:
+        return
+    db.session.execute(db.insert(QueuedPush), [
+        {'user_id': user_id, 'title': title, 'body': body, 'url': url}
+        for user_id in user_ids
+    ])
 
 
 @app.route('/api/push/vapid-key', methods=['GET'])
@@ -2950,6 +3665,7 @@ def test_push():
         'Push notifications are working! 🎉',
         '/'
     )
+    db.session.commit()
     
     if success:
         return jsonify({'message': 'Test notification sent'}), 200
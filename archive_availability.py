@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Cron job script to archive old availability and prune past slots.
+Run daily. Moves UserAvailability and legacy Availability rows whose week started
+before the retention horizon into availability_archive (legacy rows only once their
+plan is gone), and drops past slots from the live slot tables and current availabilities.
+"""
+
+import os
+import sys
+from datetime import timedelta, date
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from models import (User, UserAvailability, UserAvailabilitySlot, Availability, AvailabilitySlot,
+                    AvailabilityArchive, FriendSlotCount, Plan)
+
+RETENTION_WEEKS = int(os.getenv('AVAILABILITY_RETENTION_WEEKS', '4'))  # Weeks of availability kept live
+BATCH_SIZE = 1000  # Rows archived per transaction
+
+def archive_rows(model, source, user_id_column, cutoff_week, *filters):
+    """Copy rows whose week started before cutoff_week (and matching filters) into the archive and delete them, in batches"""
+    total = 0
+    while True:
+        rows = model.query.filter(
+            model.week_start_date < cutoff_week, *filters
+        ).order_by(model.id).limit(BATCH_SIZE).all()
+        if not rows:
+            return total
+        
+        db.session.execute(db.insert(AvailabilityArchive), [
+            {
+                'source': source,
+                'source_id': row.id,
+                'user_id': getattr(row, user_id_column),
+                'contact_id': getattr(row, 'contact_id', None),
+                'week_start_date': row.week_start_date,
+                'time_slots': row.time_slots,
+                'submitted_at': row.submitted_at,
+                'updated_at': row.updated_at
+            }
+            for row in rows
+        ])
+        row_ids = [row.id for row in rows]
+        if model is Availability:
+            AvailabilitySlot.query.filter(AvailabilitySlot.availability_id.in_(row_ids)).delete(synchronize_session=False)
+        model.query.filter(model.id.in_(row_ids)).delete(synchronize_session=False)
+        db.session.commit()
+        db.session.expunge_all()
+        total += len(rows)
+
+def prune_current_availabilities(cutoff_date):
+    """Drop slots before cutoff_date from users' current availabilities"""
+    cutoff_str = cutoff_date.isoformat()
+    pruned = 0
+    # Only availabilities whose week started before the cutoff can hold past slots
+    stale = UserAvailability.query.join(
+        User, User.current_availability_id == UserAvailability.id
+    ).filter(UserAvailability.week_start_date < cutoff_date).all()
+    for availability in stale:
+        time_slots = availability.time_slots or []
+        kept = [s for s in time_slots if s.get('date', '') >= cutoff_str]
+        if len(kept) != len(time_slots):
+            availability.set_time_slots(kept)
+            # Keep the user's own last-edit time; the onupdate would stamp it with this run
+            availability.updated_at = UserAvailability.updated_at
+            pruned += 1
+    db.session.commit()
+    return pruned
+
+def archive_availability():
+    """Archive availability past the retention horizon and prune past slots"""
+    
+    with app.app_context():
+        today = date.today()
+        # Use yesterday as the cutoff for past slots to handle timezone differences (server is UTC)
+        cutoff_date = today - timedelta(days=1)
+        cutoff_week = today - timedelta(days=today.weekday()) - timedelta(weeks=RETENTION_WEEKS)
+        print(f"[ARCHIVE] Archiving availability from weeks before {cutoff_week}, pruning slots before {cutoff_date}")
+        
+        # Users' current availabilities stay live however old they are
+        current_ids = db.session.query(User.current_availability_id).filter(User.current_availability_id.isnot(None))
+        archived = archive_rows(UserAvailability, 'user_availability', 'user_id', cutoff_week,
+                                UserAvailability.id.notin_(current_ids))
+        print(f"[ARCHIVE] Archived {archived} weekly availabilities")
+        
+        # Legacy availability stays live while its plan (same planner and week) still exists
+        plan_exists = Plan.query.filter(
+            Plan.planner_id == Availability.planner_id,
+            Plan.week_start_date == Availability.week_start_date
+        ).exists()
+        archived = archive_rows(Availability, 'availability', 'planner_id', cutoff_week, ~plan_exists)
+        print(f"[ARCHIVE] Archived {archived} legacy availabilities")
+        
+        pruned = prune_current_availabilities(cutoff_date)
+        print(f"[ARCHIVE] Pruned past slots from {pruned} current availabilities")
+        
+        deleted_slots = UserAvailabilitySlot.query.filter(UserAvailabilitySlot.date < cutoff_date).delete(synchronize_session=False)
+        deleted_counts = FriendSlotCount.query.filter(FriendSlotCount.date < cutoff_date).delete(synchronize_session=False)
+        db.session.commit()
+        print(f"[ARCHIVE] Deleted {deleted_slots} past slot rows and {deleted_counts} past heatmap cells")
+
+if __name__ == '__main__':
+    archive_availability()
@@ -0,0 +1,18 @@
+"""
+Gunicorn settings for the web process (see Procfile).
+
+gevent workers let one worker hold up to 1000 idle event streams, but psycopg2 is a
+C extension that gevent's monkey-patching can't reach: without a wait callback every
+query blocks the worker's whole event loop (all open streams, the EventBroker poll and
+every other request). psycogreen installs that callback so queries yield to other
+greenlets while waiting on Postgres.
+"""
+
+worker_class = 'gevent'
+worker_connections = 1000
+
+
+def post_fork(server, worker):
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+    server.log.info(f"Worker {worker.pid}: psycopg2 patched for gevent")
@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import validates, selectinload
+from datetime import datetime, timedelta, date
 from werkzeug.security import generate_password_hash, check_password_hash
 import secrets
 import re
@@ -15,6 +17,79 @@ def normalize_phone(phone):
         digits = '1' + digits
     return '+' + digits
 
+def phone_key(phone):
+    """Canonical lookup key for a phone number: its last 10 digits"""
+    if not phone:
+        return None
+    digits = re.sub(r'\D', '', phone)
+    return digits[-10:] or None
+
+# Availability slots packed into an integer: bit (day_offset * 3 + slot_index), counted from
+# the record's week_start_date. Three weeks (63 bits) so the 14-day calendar fits from any weekday.
+SLOT_NAMES = ['morning', 'afternoon', 'evening']
+SLOT_MASK_DAYS = 21
+
+def iter_slot_dates(time_slots, week_start):
+    """Yield unique (date, slot name) pairs from a time_slots list"""
+    seen = set()
+    for slot in time_slots:
+        if slot.get('date'):
+            slot_date = date.fromisoformat(slot['date'])
+        elif 'day' in slot:
+            # Backwards compatibility
+            slot_date = week_start + timedelta(days=slot['day'])
+        else:
+            continue
+        if slot.get('slot') in SLOT_NAMES and (slot_date, slot['slot']) not in seen:
+            seen.add((slot_date, slot['slot']))
+            yield slot_date, slot['slot']
+
+def encode_slot_mask(time_slots, week_start):
+    """Pack a time_slots list into a bitmask relative to week_start"""
+    mask = 0
+    for slot_date, slot_name in iter_slot_dates(time_slots, week_start):
+        offset = (slot_date - week_start).days
+        if 0 <= offset < SLOT_MASK_DAYS:
+            mask |= 1 << (offset * len(SLOT_NAMES) + SLOT_NAMES.index(slot_name))
+    return mask
+
+def decode_slot_mask(mask, week_start):
+    """Unpack a bitmask relative to week_start into a time_slots list"""
+    time_slots = []
+    bit = 0
+    while mask:
+        if mask & 1:
+            day, slot_index = divmod(bit, len(SLOT_NAMES))
+            time_slots.append({'date': (week_start + timedelta(days=day)).isoformat(), 'slot': SLOT_NAMES[slot_index]})
+        mask >>= 1
+        bit += 1
+    return time_slots
+
+def shift_slot_mask(mask, from_start, to_start):
+    """Re-anchor a bitmask from one start date to another (slots before to_start are dropped)"""
+    shift = (from_start - to_start).days * len(SLOT_NAMES)
+    return mask << shift if shift >= 0 else mask >> -shift
+
+def slot_mask_counts(masks, num_bits):
+    """For each bit position, count how many masks have it set.
+    
+    Uses a bit-sliced adder: planes[i] holds bit i of every position's count, so each mask is
+    added with a few whole-integer XOR/AND operations instead of a loop over its slots.
+    """
+    planes = []
+    for mask in masks:
+        carry = mask
+        for i, plane in enumerate(planes):
+            planes[i], carry = plane ^ carry, plane & carry
+            if not carry:
+                break
+        if carry:
+            planes.append(carry)
+    return [
+        sum(((plane >> bit) & 1) << i for i, plane in enumerate(planes))
+        for bit in range(num_bits)
+    ]
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -22,6 +97,7 @@ class User(db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     phone_number = db.Column(db.String(20), nullable=False)
+    phone_key = db.Column(db.String(10), index=True)  # Last 10 digits of phone_number, kept in sync by set_phone_key
     password_hash = db.Column(db.String(200), nullable=False)
     reminder_days = db.Column(db.JSON, default=lambda: ["monday", "tuesday", "wednesday", "thursday"])  # Legacy - kept for compatibility
     notification_friend_ids = db.Column(db.JSON, default=list)  # List of friend user IDs to notify about availability updates
@@ -29,13 +105,44 @@ class User(db.Model):
     has_seen_install_prompt = db.Column(db.Boolean, default=False)  # Whether user has seen the "Add to Home Screen" prompt
     availability_notification_pending = db.Column(db.Boolean, default=False)  # Whether availability notification is pending
     availability_updated_at = db.Column(db.DateTime, nullable=True)  # When availability was last updated
+    pending_slot_mask = db.Column(db.BigInteger)  # Slots added since the last availability notification (bitmask)
+    pending_slot_week = db.Column(db.Date)  # Week start date pending_slot_mask is anchored to
     timezone = db.Column(db.String(50), default='America/New_York')  # User's timezone
     weekly_availability_date = db.Column(db.Date)  # Date of the Monday when user submitted availability this week
+    friends_version = db.Column(db.Integer, default=0)  # Bumped when a friend's availability or the friend set changes (ETag for friends' availability)
+    current_availability_id = db.Column(db.Integer, db.ForeignKey('user_availability.id', use_alter=True, name='fk_users_current_availability'))  # Most recently saved UserAvailability
+    unread_notification_count = db.Column(db.Integer, default=0)  # Kept in sync with unread Notifications (see count_unread_notification)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     plans_created = db.relationship('Plan', backref='planner', lazy=True, foreign_keys='Plan.planner_id')
     contacts = db.relationship('Contact', backref='owner', lazy=True, cascade='all, delete-orphan')
+    current_availability = db.relationship('UserAvailability', foreign_keys=[current_availability_id], post_update=True)
+    
+    @validates('phone_number')
+    def set_phone_key(self, key, phone_number):
+        self.phone_key = phone_key(phone_number)
+        return phone_number
+    
+    @staticmethod
+    def add_unread_notifications(user_ids, count=1):
+        """Count notifications inserted in bulk (bulk inserts skip the after_insert hook)"""
+        User.query.filter(User.id.in_(user_ids)).update(
+            {User.unread_notification_count: db.func.coalesce(User.unread_notification_count, 0) + count},
+            synchronize_session=False
+        )
+    
+    @staticmethod
+    def recount_unread_notifications(user_ids):
+        """Recompute unread counts from the notifications table, e.g. after deleting notifications"""
+        unread = db.select(db.func.count(Notification.id)).where(
+            Notification.planner_id == User.id,
+            Notification.read == False
+        ).scalar_subquery()
+        User.query.filter(User.id.in_(user_ids)).update(
+            {User.unread_notification_count: unread},
+            synchronize_session=False
+        )
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -76,6 +183,7 @@ class Contact(db.Model):
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     phone_number = db.Column(db.String(20), nullable=False)
+    phone_key = db.Column(db.String(10), index=True)  # Last 10 digits of phone_number, kept in sync by set_phone_key
     display_order = db.Column(db.Integer, default=0)  # Order for displaying contacts
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -88,62 +196,75 @@ class Contact(db.Model):
     plan_guests = db.relationship('PlanGuest', backref='contact', lazy=True)
     availabilities = db.relationship('Availability', backref='contact', lazy=True)
     
+    @validates('phone_number')
+    def set_phone_key(self, key, phone_number):
+        self.phone_key = phone_key(phone_number)
+        return phone_number
+    
     def to_dict(self):
-        # Check if this contact is a linked friend (mutual connection) or has pending request
-        is_linked = False
-        is_pending = False
-        linked_user_id = None
+        return Contact.to_dict_list([self])[0]
+    
+    @staticmethod
+    def to_dict_list(contacts):
+        """Serialize contacts, resolving link status for the whole list in a fixed number of queries"""
+        if not contacts:
+            return []
+        
+        # Find which contacts' phone numbers belong to registered users (matched on last 10 digits)
+        keys = {c.phone_key for c in contacts if c.phone_key}
+        users_by_key = {}
+        if keys:
+            for user_id, key in db.session.query(User.id, User.phone_key).filter(User.phone_key.in_(keys)).order_by(User.id):
+                users_by_key.setdefault(key, user_id)
         
-        # Find if contact's phone number belongs to a registered user (with normalized matching)
-        linked_user = None
-        normalized = normalize_phone(self.phone_number)
+        # Load accepted friendships and pending friend requests between owners and linked users
+        owner_ids = {c.owner_id for c in contacts}
+        linked_ids = set(users_by_key.values())
+        friend_pairs = set()
+        pending_pairs = set()
+        if linked_ids:
+            friendships = db.session.query(Friendship.user_id_1, Friendship.user_id_2).filter(
+                (Friendship.user_id_1.in_(owner_ids) & Friendship.user_id_2.in_(linked_ids)) |
+                (Friendship.user_id_1.in_(linked_ids) & Friendship.user_id_2.in_(owner_ids))
+            )
+            friend_pairs = {frozenset(pair) for pair in friendships}
+            
+            pending_requests = db.session.query(FriendRequest.from_user_id, FriendRequest.to_user_id).filter(
+                (FriendRequest.from_user_id.in_(owner_ids) & FriendRequest.to_user_id.in_(linked_ids)) |
+                (FriendRequest.from_user_id.in_(linked_ids) & FriendRequest.to_user_id.in_(owner_ids))
+            ).filter(FriendRequest.status == 'pending')
+            pending_pairs = {frozenset(pair) for pair in pending_requests}
         
-        # Try exact match first, then normalized
-        linked_user = User.query.filter_by(phone_number=self.phone_number).first()
-        if not linked_user:
-            linked_user = User.query.filter_by(phone_number=normalized).first()
-        if not linked_user:
-            # Try matching last 10 digits
-            digits = re.sub(r'\D', '', self.phone_number) if self.phone_number else ''
-            if len(digits) >= 10:
-                last_10 = digits[-10:]
-                for u in User.query.all():
-                    if not u.phone_number:
-                        continue
-                    u_digits = re.sub(r'\D', '', u.phone_number)
-                    if len(u_digits) >= 10 and u_digits[-10:] == last_10:
-                        linked_user = u
-                        break
-        if linked_user and linked_user.id != self.owner_id:
-            # Check if there's an accepted friendship
-            friendship = Friendship.query.filter(
-                ((Friendship.user_id_1 == self.owner_id) & (Friendship.user_id_2 == linked_user.id)) |
-                ((Friendship.user_id_1 == linked_user.id) & (Friendship.user_id_2 == self.owner_id))
-            ).first()
-            if friendship:
-                is_linked = True
-                linked_user_id = linked_user.id
-            else:
-                # Check if there's a pending friend request
-                pending_request = FriendRequest.query.filter(
-                    ((FriendRequest.from_user_id == self.owner_id) & (FriendRequest.to_user_id == linked_user.id)) |
-                    ((FriendRequest.from_user_id == linked_user.id) & (FriendRequest.to_user_id == self.owner_id))
-                ).filter(FriendRequest.status == 'pending').first()
-                if pending_request:
+        results = []
+        for contact in contacts:
+            # Check if this contact is a linked friend (mutual connection) or has pending request
+            is_linked = False
+            is_pending = False
+            linked_user_id = None
+            
+            linked_id = users_by_key.get(contact.phone_key)
+            if linked_id and linked_id != contact.owner_id:
+                pair = frozenset((contact.owner_id, linked_id))
+                if pair in friend_pairs:
+                    is_linked = True
+                    linked_user_id = linked_id
+                elif pair in pending_pairs:
                     is_pending = True
-                    linked_user_id = linked_user.id
+                    linked_user_id = linked_id
+            
+            results.append({
+                'id': contact.id,
+                'owner_id': contact.owner_id,
+                'name': contact.name,
+                'phone_number': contact.phone_number,
+                'display_order': contact.display_order,
+                'is_linked': is_linked,
+                'is_pending': is_pending,
+                'linked_user_id': linked_user_id,
+                'created_at': contact.created_at.isoformat() + 'Z'
+            })
         
-        return {
-            'id': self.id,
-            'owner_id': self.owner_id,
-            'name': self.name,
-            'phone_number': self.phone_number,
-            'display_order': self.display_order,
-            'is_linked': is_linked,
-            'is_pending': is_pending,
-            'linked_user_id': linked_user_id,
-            'created_at': self.created_at.isoformat() + 'Z'
-        }
+        return results
 
 
 class FriendRequest(db.Model):
@@ -203,6 +324,13 @@ class Friendship(db.Model):
         higher_id = max(user_a_id, user_b_id)
         return Friendship(user_id_1=lower_id, user_id_2=higher_id)
     
+    @staticmethod
+    def friend_ids_select(user_id):
+        """Select the ids of all of a user's friends (for use in IN clauses)"""
+        return db.select(Friendship.user_id_2).where(Friendship.user_id_1 == user_id).union(
+            db.select(Friendship.user_id_1).where(Friendship.user_id_2 == user_id)
+        )
+    
     @staticmethod
     def are_friends(user_a_id, user_b_id):
         """Check if two users are friends"""
@@ -280,6 +408,7 @@ class Availability(db.Model):
     planner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     contact_id = db.Column(db.Integer, db.ForeignKey('contacts.id'), nullable=True)
     time_slots = db.Column(db.JSON, nullable=False)
+    slot_mask = db.Column(db.BigInteger, default=0)  # time_slots packed by encode_slot_mask, kept in sync by set_time_slots
     message = db.Column(db.String(200))
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -288,6 +417,17 @@ class Availability(db.Model):
         db.UniqueConstraint('week_start_date', 'planner_id', 'contact_id', name='unique_availability_per_week'),
     )
     
+    # One row per slot, for date-range queries in SQL
+    slots = db.relationship('AvailabilitySlot', backref='availability', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    
+    def set_time_slots(self, time_slots):
+        self.time_slots = time_slots
+        self.slot_mask = encode_slot_mask(time_slots, self.week_start_date)
+        self.slots = [
+            AvailabilitySlot(planner_id=self.planner_id, date=slot_date, slot=slot_name)
+            for slot_date, slot_name in iter_slot_dates(time_slots, self.week_start_date)
+        ]
+    
     def to_dict(self):
         if self.contact_id:
             name = self.contact.name
@@ -309,6 +449,21 @@ class Availability(db.Model):
         }
 
 
+class AvailabilitySlot(db.Model):
+    """One slot of a legacy Availability record, kept in sync by Availability.set_time_slots"""
+    __tablename__ = 'availability_slots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    availability_id = db.Column(db.Integer, db.ForeignKey('availability.id', ondelete='CASCADE'), nullable=False)
+    planner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    slot = db.Column(db.String(20), nullable=False)  # morning, afternoon, evening
+    
+    __table_args__ = (
+        db.Index('ix_availability_slots_planner_date', 'planner_id', 'date'),
+    )
+
+
 class UserAvailability(db.Model):
     """User's weekly availability - shown to their linked friends"""
     __tablename__ = 'user_availability'
@@ -317,6 +472,9 @@ class UserAvailability(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     week_start_date = db.Column(db.Date, nullable=False)  # Monday of the week
     time_slots = db.Column(db.JSON, nullable=False)  # [{"date": "2025-11-12", "slot": "morning"}, ...]
+    last_slot_date = db.Column(db.Date)  # Latest date in time_slots, kept in sync by set_time_slots
+    slot_mask = db.Column(db.BigInteger, default=0)  # time_slots packed by encode_slot_mask, kept in sync by set_time_slots
+    version = db.Column(db.Integer, default=0)  # Bumped on every save; carried over to the next week's row
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -326,7 +484,20 @@ class UserAvailability(db.Model):
     )
     
     # Relationship
-    user = db.relationship('User', backref='weekly_availabilities')
+    user = db.relationship('User', foreign_keys=[user_id], backref='weekly_availabilities')
+    
+    @staticmethod
+    def current_for(user_ids):
+        """Query the current (most recently saved) availability of each of these users"""
+        return UserAvailability.query.join(
+            User, User.current_availability_id == UserAvailability.id
+        ).filter(User.id.in_(user_ids))
+    
+    def set_time_slots(self, time_slots):
+        self.time_slots = time_slots
+        dates = [slot['date'] for slot in time_slots if slot.get('date')]
+        self.last_slot_date = date.fromisoformat(max(dates)) if dates else None
+        self.slot_mask = encode_slot_mask(time_slots, self.week_start_date)
     
     def to_dict(self):
         return {
@@ -335,11 +506,145 @@ class UserAvailability(db.Model):
             'user_name': self.user.name,
             'week_start_date': self.week_start_date.isoformat(),
             'time_slots': self.time_slots,
+            'version': self.version or 0,
             'submitted_at': self.submitted_at.isoformat() + 'Z',
             'updated_at': self.updated_at.isoformat() + 'Z'
         }
 
 
+class UserAvailabilitySlot(db.Model):
+    """One row per slot in a user's current availability, kept in sync when they save"""
+    __tablename__ = 'user_availability_slots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    slot = db.Column(db.String(20), nullable=False)  # morning, afternoon, evening
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'date', 'slot', name='unique_user_availability_slot'),
+        db.Index('ix_user_availability_slots_date_slot', 'date', 'slot'),
+    )
+    
+    @staticmethod
+    def sync_for_user(user_id, time_slots, week_start):
+        """Bring a user's slot rows in line with time_slots, touching only the slots that changed"""
+        existing = {
+            (slot_date, slot_name): slot_id
+            for slot_id, slot_date, slot_name in db.session.query(
+                UserAvailabilitySlot.id, UserAvailabilitySlot.date, UserAvailabilitySlot.slot
+            ).filter_by(user_id=user_id)
+        }
+        wanted = set(iter_slot_dates(time_slots, week_start))
+        
+        removed = [key for key in existing if key not in wanted]
+        added = [key for key in wanted if key not in existing]
+        if removed:
+            UserAvailabilitySlot.query.filter(
+                UserAvailabilitySlot.id.in_([existing[key] for key in removed])
+            ).delete(synchronize_session=False)
+        if added:
+            db.session.execute(db.insert(UserAvailabilitySlot), [
+                {'user_id': user_id, 'date': slot_date, 'slot': slot_name}
+                for slot_date, slot_name in added
+            ])
+        return added, removed
+
+
+class AvailabilityArchive(db.Model):
+    """Availability rows past the retention horizon, moved here by archive_availability.py"""
+    __tablename__ = 'availability_archive'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(20), nullable=False)  # 'user_availability' or 'availability' (legacy)
+    source_id = db.Column(db.Integer, nullable=False)  # id of the row in the source table
+    user_id = db.Column(db.Integer, nullable=False)  # UserAvailability.user_id / Availability.planner_id (no FK, outlives the user)
+    contact_id = db.Column(db.Integer)  # Legacy Availability.contact_id
+    week_start_date = db.Column(db.Date, nullable=False)
+    time_slots = db.Column(db.JSON, nullable=False)
+    submitted_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_availability_archive_user_week', 'user_id', 'week_start_date'),
+    )
+
+
+class FriendSlotCount(db.Model):
+    """How many of a user's friends are free in each slot, maintained incrementally from UserAvailabilitySlot"""
+    __tablename__ = 'friend_slot_counts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    slot = db.Column(db.String(20), nullable=False)  # 'morning', 'afternoon', 'evening'
+    free_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'date', 'slot', name='unique_friend_slot_count'),
+    )
+    
+    @staticmethod
+    def adjust(user_ids, counts):
+        """Add counts ({(date, slot): n}, n may be negative) to each of these users' cells
+        
+        Upserts so concurrent saves by different friends can't collide, in (user_id, date, slot)
+        order so they always lock cells in the same order and can't deadlock. Cells that drop
+        to zero are deleted.
+        """
+        user_ids = list(user_ids)
+        counts = {key: n for key, n in counts.items() if n}
+        if not user_ids or not counts:
+            return
+        
+        if db.session.get_bind().dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(FriendSlotCount)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'date', 'slot'],
+            set_={'free_count': FriendSlotCount.free_count + stmt.excluded.free_count}
+        )
+        db.session.execute(stmt, [
+            {'user_id': user_id, 'date': slot_date, 'slot': slot_name, 'free_count': counts[(slot_date, slot_name)]}
+            for user_id in sorted(user_ids)
+            for slot_date, slot_name in sorted(counts)
+        ])
+        
+        if any(n < 0 for n in counts.values()):
+            FriendSlotCount.query.filter(
+                FriendSlotCount.user_id.in_(user_ids),
+                FriendSlotCount.free_count <= 0
+            ).delete(synchronize_session=False)
+    
+    @staticmethod
+    def friendships_changed(user_id, friend_ids, delta):
+        """Count (delta=1) or uncount (delta=-1) upcoming slots across new or removed friendships
+        between user_id and each of friend_ids"""
+        friend_ids = list(friend_ids)
+        if not friend_ids:
+            return
+        today = date.today()
+        
+        # The user's slots show up in each friend's grid
+        user_slots = db.session.query(UserAvailabilitySlot.date, UserAvailabilitySlot.slot).filter(
+            UserAvailabilitySlot.user_id == user_id,
+            UserAvailabilitySlot.date >= today
+        ).all()
+        FriendSlotCount.adjust(friend_ids, {(slot_date, slot_name): delta for slot_date, slot_name in user_slots})
+        
+        # And the friends' slots show up in the user's grid
+        friend_slots = db.session.query(
+            UserAvailabilitySlot.date, UserAvailabilitySlot.slot, db.func.count()
+        ).filter(
+            UserAvailabilitySlot.user_id.in_(friend_ids),
+            UserAvailabilitySlot.date >= today
+        ).group_by(UserAvailabilitySlot.date, UserAvailabilitySlot.slot).all()
+        FriendSlotCount.adjust([user_id], {(slot_date, slot_name): delta * n for slot_date, slot_name, n in friend_slots})
+
+
 class Notification(db.Model):
     __tablename__ = 'notifications'
     
@@ -354,6 +659,12 @@ class Notification(db.Model):
     notification_type = db.Column(db.String(30), default='general')  # general, friend_request, hangout_invite, hangout_response
     hangout_id = db.Column(db.Integer, db.ForeignKey('hangouts.id'), nullable=True)
     from_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Who triggered this notification
+    rollup_count = db.Column(db.Integer, default=1)  # How many repeats prune_notifications.py collapsed into this row
+    
+    # Cursor pagination walks a planner's notifications by id
+    __table_args__ = (
+        db.Index('ix_notifications_planner_id_id', 'planner_id', 'id'),
+    )
     
     # Relationships
     planner = db.relationship('User', foreign_keys=[planner_id])
@@ -362,25 +673,70 @@ class Notification(db.Model):
     from_user = db.relationship('User', foreign_keys=[from_user_id])
     
     def to_dict(self):
-        result = {
-            'id': self.id,
-            'planner_id': self.planner_id,
-            'contact_id': self.contact_id,
-            'contact_name': self.contact.name if self.contact else None,
-            'message': self.message,
-            'read': self.read,
-            'notification_type': self.notification_type or 'general',
-            'hangout_id': self.hangout_id,
-            'from_user_id': self.from_user_id,
-            'from_user_name': self.from_user.name if self.from_user else None,
-            'created_at': self.created_at.isoformat() + 'Z'  # Add Z to indicate UTC
-        }
+        return Notification.to_dict_list([self])[0]
+    
+    @staticmethod
+    def to_dict_list(notifications):
+        """Serialize notifications, loading contacts, users and hangouts for the whole list in a fixed number of queries"""
+        if not notifications:
+            return []
         
-        # Include hangout details if this is a hangout notification
-        if self.hangout:
-            result['hangout'] = self.hangout.to_dict()
+        contact_ids = {n.contact_id for n in notifications if n.contact_id}
+        contact_names = dict(
+            db.session.query(Contact.id, Contact.name).filter(Contact.id.in_(contact_ids))
+        ) if contact_ids else {}
         
-        return result
+        # Hangouts with their invitees (selectin: one more query for all invitees)
+        hangout_ids = {n.hangout_id for n in notifications if n.hangout_id}
+        hangouts = {
+            hangout.id: hangout
+            for hangout in Hangout.query.options(selectinload(Hangout.invitees)).filter(Hangout.id.in_(hangout_ids))
+        } if hangout_ids else {}
+        
+        # Every user named anywhere in the payload, in one query
+        user_ids = {n.from_user_id for n in notifications if n.from_user_id}
+        for hangout in hangouts.values():
+            user_ids.add(hangout.creator_id)
+            user_ids.update(inv.user_id for inv in hangout.invitees)
+        user_names = dict(
+            db.session.query(User.id, User.name).filter(User.id.in_(user_ids))
+        ) if user_ids else {}
+        
+        results = []
+        for n in notifications:
+            result = {
+                'id': n.id,
+                'planner_id': n.planner_id,
+                'contact_id': n.contact_id,
+                'contact_name': contact_names.get(n.contact_id),
+                'message': n.message,
+                'read': n.read,
+                'notification_type': n.notification_type or 'general',
+                'hangout_id': n.hangout_id,
+                'from_user_id': n.from_user_id,
+                'from_user_name': user_names.get(n.from_user_id),
+                'rollup_count': n.rollup_count or 1,
+                'created_at': n.created_at.isoformat() + 'Z'  # Add Z to indicate UTC
+            }
+            
+            # Include hangout details if this is a hangout notification
+            hangout = hangouts.get(n.hangout_id)
+            if hangout:
+                result['hangout'] = hangout.to_dict(user_names)
+            
+            results.append(result)
+        return results
+
+
+@event.listens_for(Notification, 'after_insert')
+def count_unread_notification(mapper, connection, target):
+    """Bump the recipient's unread count whenever a Notification is added through the ORM"""
+    if not target.read:
+        connection.execute(
+            User.__table__.update().where(User.__table__.c.id == target.planner_id).values(
+                unread_notification_count=db.func.coalesce(User.__table__.c.unread_notification_count, 0) + 1
+            )
+        )
 
 
 class PasswordReset(db.Model):
@@ -423,17 +779,18 @@ class Hangout(db.Model):
     creator = db.relationship('User', backref='hangouts_created')
     invitees = db.relationship('HangoutInvitee', backref='hangout', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
+    def to_dict(self, user_names=None):
+        """user_names ({user_id: name}) lets list serializers skip loading each User"""
         return {
             'id': self.id,
             'creator_id': self.creator_id,
-            'creator_name': self.creator.name,
+            'creator_name': user_names.get(self.creator_id) if user_names is not None else self.creator.name,
             'date': self.date,
             'time_slot': self.time_slot,
             'description': self.description,
             'status': self.status,
             'created_at': self.created_at.isoformat() + 'Z',
-            'invitees': [inv.to_dict() for inv in self.invitees]
+            'invitees': [inv.to_dict(user_names) for inv in self.invitees]
         }
 
 
@@ -456,12 +813,12 @@ class HangoutInvitee(db.Model):
         db.UniqueConstraint('hangout_id', 'user_id', name='unique_invitee_per_hangout'),
     )
     
-    def to_dict(self):
+    def to_dict(self, user_names=None):
         return {
             'id': self.id,
             'hangout_id': self.hangout_id,
             'user_id': self.user_id,
-            'user_name': self.user.name,
+            'user_name': user_names.get(self.user_id) if user_names is not None else self.user.name,
             'status': self.status,
             'responded_at': self.responded_at.isoformat() + 'Z' if self.responded_at else None,
             'created_at': self.created_at.isoformat() + 'Z'
@@ -491,6 +848,48 @@ class PushSubscription(db.Model):
         }
 
 
+class QueuedPush(db.Model):
+    """Outbound push notifications, delivered by send_queued_pushes.py"""
+    __tablename__ = 'push_queue'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.String(500), nullable=False)
+    url = db.Column(db.String(500))
+    notification_id = db.Column(db.Integer)  # Passed through to the service worker
+    coalesce_key = db.Column(db.String(100))  # Pushes to the same user with the same key merge while queued
+    coalesce_count = db.Column(db.Integer, default=1)  # How many pushes were merged into this one
+    summary_title = db.Column(db.String(200))  # Title used instead of title once merged
+    summary_body = db.Column(db.String(500))  # Body used once merged, with {count} filled in
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.String(500))
+    next_attempt_at = db.Column(db.DateTime)  # Retry time for pending pushes; claim expiry for sending ones
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_push_queue_status_id', 'status', 'id'),
+        db.Index('ix_push_queue_user_coalesce_key', 'user_id', 'coalesce_key'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'title': self.title,
+            'body': self.body,
+            'url': self.url,
+            'status': self.status,
+            'coalesce_count': self.coalesce_count or 1,
+            'attempts': self.attempts or 0,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() + 'Z',
+            'sent_at': self.sent_at.isoformat() + 'Z' if self.sent_at else None
+        }
+
+
 class HangoutMessage(db.Model):
     """Chat messages for hangouts/plans"""
     __tablename__ = 'hangout_messages'
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Cron job script to keep the notifications table small.
+Run daily. Collapses exact repeats of a notification from the same sender into one
+rolled-up row, then archives read notifications older than the retention period.
+Everything deleted is first written to gzipped JSON Lines files in
+NOTIFICATION_ARCHIVE_DIR, which must be set to a persistent volume.
+"""
+
+import os
+import sys
+import gzip
+import json
+from datetime import datetime, timedelta
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db
+from models import User, Notification
+
+RETENTION_DAYS = int(os.getenv('NOTIFICATION_RETENTION_DAYS', '30'))  # Read notifications kept live this long
+ARCHIVE_DIR = os.getenv('NOTIFICATION_ARCHIVE_DIR')  # Required: a persistent volume (the container filesystem is not)
+BATCH_SIZE = 5000  # Notifications archived per file
+
+def write_archive(rows, prefix, rolled_up_into=None):
+    """Write notifications to a new gzipped JSONL file in ARCHIVE_DIR and return its path
+    
+    rolled_up_into maps the ids of collapsed repeats to the id of the row that now counts them.
+    """
+    path = os.path.join(ARCHIVE_DIR, f"{prefix}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}-{rows[0].id}.jsonl.gz")
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for n in rows:
+            f.write(json.dumps({
+                'id': n.id,
+                'planner_id': n.planner_id,
+                'contact_id': n.contact_id,
+                'message': n.message,
+                'notification_type': n.notification_type,
+                'hangout_id': n.hangout_id,
+                'from_user_id': n.from_user_id,
+                'read': bool(n.read),
+                'rollup_count': n.rollup_count or 1,
+                'rolled_up_into': (rolled_up_into or {}).get(n.id),
+                'created_at': n.created_at.isoformat() + 'Z'
+            }) + '\n')
+    return path
+
+def rollup_notifications():
+    """Collapse each planner's exact repeats (same message, type, sender, hangout and read state) into the newest row
+    
+    Most notifications share the 'general' type, so the message text is part of the key;
+    otherwise unrelated events from the same sender would be merged. The collapsed rows
+    are archived before they are deleted.
+    """
+    groups = db.session.query(
+        Notification.planner_id,
+        Notification.notification_type,
+        Notification.from_user_id,
+        Notification.hangout_id,
+        Notification.message,
+        Notification.read,
+        db.func.max(Notification.id),
+        db.func.sum(db.func.coalesce(Notification.rollup_count, 1))
+    ).filter(
+        Notification.from_user_id.isnot(None)
+    ).group_by(
+        Notification.planner_id,
+        Notification.notification_type,
+        Notification.from_user_id,
+        Notification.hangout_id,
+        Notification.message,
+        Notification.read
+    ).having(db.func.count(Notification.id) > 1).all()
+    
+    rolled_up_into = {}
+    unread_planner_ids = set()
+    for planner_id, notification_type, from_user_id, hangout_id, message, read, keep_id, total in groups:
+        # NULL columns have to be matched with IS NULL
+        same_group = [
+            Notification.planner_id == planner_id,
+            Notification.from_user_id == from_user_id,
+            Notification.message == message,
+            Notification.notification_type.is_(None) if notification_type is None else Notification.notification_type == notification_type,
+            Notification.hangout_id.is_(None) if hangout_id is None else Notification.hangout_id == hangout_id,
+            Notification.read.is_(None) if read is None else Notification.read == read
+        ]
+        for (repeat_id,) in db.session.query(Notification.id).filter(*same_group, Notification.id < keep_id):
+            rolled_up_into[repeat_id] = keep_id
+        Notification.query.filter_by(id=keep_id).update({Notification.rollup_count: total}, synchronize_session=False)
+        if not read:
+            unread_planner_ids.add(planner_id)
+    
+    # Archive the repeats before deleting them; nothing is committed until every file is written
+    repeat_ids = sorted(rolled_up_into)
+    for i in range(0, len(repeat_ids), BATCH_SIZE):
+        batch_ids = repeat_ids[i:i + BATCH_SIZE]
+        rows = Notification.query.filter(Notification.id.in_(batch_ids)).order_by(Notification.id).all()
+        path = write_archive(rows, 'rollup', rolled_up_into)
+        Notification.query.filter(Notification.id.in_(batch_ids)).delete(synchronize_session=False)
+        print(f"[PRUNE NOTIFICATIONS] Archived {len(rows)} rolled-up repeats to {path}")
+    
+    if unread_planner_ids:
+        User.recount_unread_notifications(list(unread_planner_ids))
+    db.session.commit()
+    db.session.expunge_all()
+    return len(groups), len(repeat_ids)
+
+def archive_read_notifications(cutoff):
+    """Write read notifications created before cutoff to gzipped JSONL files and delete them"""
+    total = 0
+    while True:
+        rows = Notification.query.filter(
+            Notification.read == True,
+            Notification.created_at < cutoff
+        ).order_by(Notification.id).limit(BATCH_SIZE).all()
+        if not rows:
+            return total
+        
+        path = write_archive(rows, 'notifications')
+        
+        # Only delete once the file is safely written
+        Notification.query.filter(Notification.id.in_([n.id for n in rows])).delete(synchronize_session=False)
+        db.session.commit()
+        db.session.expunge_all()
+        total += len(rows)
+        print(f"[PRUNE NOTIFICATIONS] Archived {len(rows)} notifications to {path}")
+
+def prune_notifications():
+    """Roll up repeated notifications and archive old read ones"""
+    
+    if not ARCHIVE_DIR:
+        # Never delete notifications into the container's ephemeral filesystem
+        print(f"[PRUNE NOTIFICATIONS] ❌ NOTIFICATION_ARCHIVE_DIR is not set; point it at a persistent volume")
+        sys.exit(1)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    
+    with app.app_context():
+        groups, removed = rollup_notifications()
+        print(f"[PRUNE NOTIFICATIONS] Rolled up {removed} repeats into {groups} notifications")
+        
+        cutoff = datetime.utcnow() - timedelta(days=RETENTION_DAYS)
+        archived = archive_read_notifications(cutoff)
+        print(f"[PRUNE NOTIFICATIONS] Archived {archived} read notifications older than {RETENTION_DAYS} days")
+
+if __name__ == '__main__':
+    prune_notifications()
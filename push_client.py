@@ -0,0 +1,94 @@
+"""
+Long-lived web push client shared by the app and the cron/worker scripts.
+
+The VAPID private key is parsed once, the signed VAPID Authorization header is reused
+per push-service origin (fcm.googleapis.com, updates.push.services.mozilla.com,
+web.push.apple.com, ...) until shortly before it expires, and each origin keeps a
+pooled keep-alive requests.Session so pushes don't pay for a new TLS handshake.
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from py_vapid import Vapid
+from pywebpush import WebPusher, WebPushException
+
+VAPID_TOKEN_SECONDS = 12 * 60 * 60  # Lifetime of a signed VAPID JWT (push services allow up to 24h)
+VAPID_REFRESH_SECONDS = 60 * 60  # Re-sign this long before the cached token expires
+POOL_SIZE = 20  # Keep-alive connections per push-service origin (>= PUSH_WORKERS)
+PUSH_TIMEOUT = 10  # Seconds to wait on a push service before giving up
+
+
+class PushOrigin:
+    """Cached VAPID header and pooled HTTP session for one push-service origin"""
+
+    def __init__(self, origin):
+        self.origin = origin
+        self.headers = None
+        self.expires_at = 0
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+
+
+class PushClient:
+    """Sends web pushes with one VAPID signer and one connection pool per origin"""
+
+    def __init__(self, private_key, email):
+        self.vapid = Vapid.from_string(private_key=private_key)
+        self.sub = f'mailto:{email}'
+        self.origins = {}
+        self.lock = threading.Lock()
+
+    def get_origin(self, endpoint):
+        url = urlparse(endpoint)
+        origin = f'{url.scheme}://{url.netloc}'
+        with self.lock:
+            if origin not in self.origins:
+                self.origins[origin] = PushOrigin(origin)
+            return self.origins[origin]
+
+    def vapid_headers(self, push_origin):
+        """Signed VAPID headers for an origin, re-signed only when the cached JWT nears expiry"""
+        now = time.time()
+        with self.lock:
+            if push_origin.headers is None or push_origin.expires_at - VAPID_REFRESH_SECONDS <= now:
+                expires_at = int(now) + VAPID_TOKEN_SECONDS
+                push_origin.headers = self.vapid.sign({
+                    'sub': self.sub,
+                    'aud': push_origin.origin,
+                    'exp': expires_at
+                })
+                push_origin.expires_at = expires_at
+            # WebPusher.send adds its own headers to the dict it is given
+            return dict(push_origin.headers)
+
+    def send(self, subscription_info, data, ttl=0):
+        """Encrypt and send one push; raises WebPushException if the push service rejects it"""
+        push_origin = self.get_origin(subscription_info['endpoint'])
+        response = WebPusher(subscription_info, requests_session=push_origin.session).send(
+            data,
+            headers=self.vapid_headers(push_origin),
+            ttl=ttl,
+            timeout=PUSH_TIMEOUT
+        )
+        if response.status_code > 202:
+            raise WebPushException(
+                f"Push failed: {response.status_code} {response.reason}\nResponse body:{response.text}",
+                response=response
+            )
+        return response
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_push_client(private_key, email):
+    """Process-wide PushClient for a VAPID key, created on first use"""
+    with _clients_lock:
+        if (private_key, email) not in _clients:
+            _clients[(private_key, email)] = PushClient(private_key, email)
+        return _clients[(private_key, email)]
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Rebuild the friend_slot_counts heatmap table from friendships and user_availability_slots.
+Run once after deploying, or any time the counts need to be recomputed from scratch.
+"""
+import os
+from datetime import date
+from app import app, db
+from models import FriendSlotCount, Friendship, UserAvailabilitySlot
+from sqlalchemy import union_all
+
+def rebuild_friend_slot_counts():
+    with app.app_context():
+        today = date.today()
+        
+        # Every (viewer, friend) pair in both directions
+        pairs = union_all(
+            db.select(Friendship.user_id_1.label('viewer_id'), Friendship.user_id_2.label('friend_id')),
+            db.select(Friendship.user_id_2.label('viewer_id'), Friendship.user_id_1.label('friend_id'))
+        ).subquery()
+        
+        counts = db.select(
+            pairs.c.viewer_id,
+            UserAvailabilitySlot.date,
+            UserAvailabilitySlot.slot,
+            db.func.count()
+        ).join(
+            UserAvailabilitySlot, UserAvailabilitySlot.user_id == pairs.c.friend_id
+        ).where(
+            UserAvailabilitySlot.date >= today
+        ).group_by(pairs.c.viewer_id, UserAvailabilitySlot.date, UserAvailabilitySlot.slot)
+        
+        FriendSlotCount.query.delete()
+        db.session.execute(
+            db.insert(FriendSlotCount).from_select(['user_id', 'date', 'slot', 'free_count'], counts)
+        )
+        db.session.commit()
+        print(f"✅ Rebuilt {FriendSlotCount.query.count()} friend slot counts")
+
+if __name__ == '__main__':
+    rebuild_friend_slot_counts()
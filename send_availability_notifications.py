@@ -6,16 +6,32 @@ Run every minute to check for users whose availability was updated more than 5 m
 
 import os
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
 
 # Add the app directory to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import app, db, send_push_notification
-from models import User, Notification, Friendship
+from models import User, Notification, Friendship, decode_slot_mask
 
 NOTIFICATION_DELAY_MINUTES = 15  # Wait 15 minutes after last update before sending
 
+def describe_added_days(user):
+    """Summarize the user's pending added slots as a list of upcoming days, e.g. 'Fri, Sat & Mon'
+    
+    Returns None when there is no recorded delta (flag set before deltas were stored),
+    and an empty string when every added slot is already in the past.
+    """
+    if not user.pending_slot_week:
+        return None
+    
+    today_str = date.today().isoformat()
+    days = sorted({s['date'] for s in decode_slot_mask(user.pending_slot_mask or 0, user.pending_slot_week) if s['date'] >= today_str})
+    names = [datetime.fromisoformat(d).strftime('%a') for d in days]
+    if len(names) <= 1:
+        return ''.join(names)
+    return f"{', '.join(names[:-1])} & {names[-1]}"
+
 def send_pending_availability_notifications():
     """Send notifications for users whose availability was updated 5+ minutes ago"""
     
@@ -37,6 +53,15 @@ def send_pending_availability_notifications():
         for user in pending_users:
             print(f"[AVAILABILITY NOTIFICATIONS] Processing {user.name} (updated at {user.availability_updated_at})")
             
+            added_days = describe_added_days(user)
+            if added_days == '':
+                print(f"   No upcoming slots in the added delta, skipping")
+                user.availability_notification_pending = False
+                user.pending_slot_mask = 0
+                continue
+            message = f"{user.name} added new availability for {added_days}" if added_days else f"{user.name} added new availability"
+            push_body = f"Free {added_days} 📅" if added_days else 'Added new availability 📅'
+            
             # Find users who have this user in their notification_friend_ids
             all_watchers = User.query.filter(User.notification_friend_ids.isnot(None)).all()
             
@@ -50,7 +75,7 @@ def send_pending_availability_notifications():
                         notification = Notification(
                             planner_id=watcher.id,
                             contact_id=None,
-                            message=f"{user.name} added new availability",
+                            message=message,
                             from_user_id=user.id
                         )
                         db.session.add(notification)
@@ -59,13 +84,14 @@ def send_pending_availability_notifications():
                         send_push_notification(
                             watcher.id,
                             user.name,
-                            'Added new availability 📅'
+                            push_body
                         )
                         notifications_sent += 1
                         print(f"   -> Notified {watcher.name}")
             
-            # Clear the pending flag
+            # Clear the pending flag and delta
             user.availability_notification_pending = False
+            user.pending_slot_mask = 0
             print(f"   Total notifications sent: {notifications_sent}")
         
         db.session.commit()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Worker script to deliver queued push notifications.
+Request handlers only queue pushes (see send_push_notification in app.py); this drains
+the queue with a bounded pool of sender threads, retrying failures with backoff.
+
+Run continuously as a worker process:  python3 send_queued_pushes.py --loop
+Or drain once (e.g. from cron):        python3 send_queued_pushes.py
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db, deliver_push
+from models import QueuedPush
+
+BATCH_SIZE = 500  # Max pushes claimed per batch
+PUSH_WORKERS = int(os.getenv('PUSH_WORKERS', '8'))  # Concurrent outbound push requests
+MAX_ATTEMPTS = 5  # Give up on a push after this many failed deliveries
+RETRY_BASE_SECONDS = 30  # Backoff after the first failure, doubled for each later one
+CLAIM_TIMEOUT = timedelta(minutes=5)  # Pushes stuck in 'sending' this long (worker died) are retried
+POLL_SECONDS = 1  # Idle wait between batches in --loop mode
+
+def claim_batch():
+    """Mark the next batch of due pushes as sending and return their ids"""
+    now = datetime.utcnow()
+    pushes = QueuedPush.query.filter(
+        QueuedPush.status.in_(['pending', 'sending']),
+        (QueuedPush.next_attempt_at.is_(None)) | (QueuedPush.next_attempt_at <= now)
+    ).order_by(QueuedPush.id).limit(BATCH_SIZE).with_for_update(skip_locked=True).all()
+
+    for push in pushes:
+        push.status = 'sending'
+        push.attempts = (push.attempts or 0) + 1
+        push.next_attempt_at = now + CLAIM_TIMEOUT
+    push_ids = [push.id for push in pushes]
+    db.session.commit()
+    return push_ids
+
+def deliver(push_id):
+    """Deliver one claimed push and record the outcome (runs on a pool thread)"""
+    with app.app_context():
+        push = db.session.get(QueuedPush, push_id)
+        try:
+            delivered, error = deliver_push(push)
+        except Exception as e:
+            delivered, error = False, str(e)[:500]
+
+        push.last_error = error
+        if delivered:
+            push.status = 'sent'
+            push.sent_at = datetime.utcnow()
+            push.next_attempt_at = None
+        elif error == 'No subscriptions' or push.attempts >= MAX_ATTEMPTS:
+            push.status = 'failed'
+            push.next_attempt_at = None
+        else:
+            push.status = 'pending'
+            push.next_attempt_at = datetime.utcnow() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (push.attempts - 1))
+        db.session.commit()
+        return push.status
+
+def send_queued_pushes(verbose=True):
+    """Deliver one batch of due pushes; returns how many were claimed"""
+
+    with app.app_context():
+        push_ids = claim_batch()
+
+    if not push_ids:
+        if verbose:
+            print(f"[PUSH QUEUE] No queued pushes to send")
+        return 0
+
+    print(f"[PUSH QUEUE] Sending {len(push_ids)} queued pushes")
+
+    with ThreadPoolExecutor(max_workers=PUSH_WORKERS) as pool:
+        statuses = list(pool.map(deliver, push_ids))
+
+    print(f"[PUSH QUEUE] Done: {statuses.count('sent')} sent, {statuses.count('pending')} to retry, {statuses.count('failed')} failed")
+    return len(push_ids)
+
+if __name__ == '__main__':
+    if '--loop' in sys.argv:
+        print(f"[PUSH QUEUE] Worker started with {PUSH_WORKERS} senders")
+        while True:
+            if not send_queued_pushes(verbose=False):
+                time.sleep(POLL_SECONDS)
+    else:
+        send_queued_pushes()
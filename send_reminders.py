@@ -4,13 +4,21 @@ Send weekly planning reminders to users via push notifications
 This script is run by Railway cron jobs:
 - Sunday evening (0 23 * * 0): General weekly reminder
 - Wednesday evening (0 23 * * 3): Weekend planning reminder with friend count
+
+Users are paged from the database and pushes go out from a pool of REMINDER_WORKERS
+sender threads, capped at REMINDER_RATE_LIMIT pushes per second.
 """
 
 import os
 import sys
 import json
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from dotenv import load_dotenv
+from sqlalchemy import or_
 from models import db, User, Friendship, UserAvailability, PushSubscription
 from flask import Flask
 
@@ -34,111 +42,164 @@ VAPID_PUBLIC_KEY = os.getenv('VAPID_PUBLIC_KEY')
 VAPID_PRIVATE_KEY = os.getenv('VAPID_PRIVATE_KEY')
 VAPID_EMAIL = os.getenv('VAPID_EMAIL', 'hello@trygatherly.com')
 
+REMINDER_BATCH_SIZE = 500  # Users loaded per page
+REMINDER_WORKERS = int(os.getenv('REMINDER_WORKERS', '16'))  # Concurrent outbound push requests
+REMINDER_RATE_LIMIT = float(os.getenv('REMINDER_RATE_LIMIT', '100'))  # Max pushes per second (0 = no cap)
 
-def send_push_notification(user_id, title, body, url=None):
-    """Send push notification to all subscriptions for a user"""
-    if not VAPID_PUBLIC_KEY or not VAPID_PRIVATE_KEY:
-        print(f"   ⚠️  VAPID keys not configured")
-        return False
-    
-    try:
-        from pywebpush import webpush
-    except ImportError:
-        print(f"   ⚠️  pywebpush not installed")
-        return False
-    
-    subscriptions = PushSubscription.query.filter_by(user_id=user_id).all()
-    if not subscriptions:
-        print(f"   ⚠️  No push subscriptions")
-        return False
+
+class RateLimiter:
+    """Spaces calls from any number of threads to at most `per_second` per second"""
     
-    payload = json.dumps({
-        'title': title,
-        'body': body,
-        'url': url or '/'
-    })
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second > 0 else 0
+        self.next_at = time.monotonic()
+        self.lock = threading.Lock()
     
-    vapid_claims = {
-        'sub': f'mailto:{VAPID_EMAIL}'
-    }
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            send_at = max(self.next_at, now)
+            self.next_at = send_at + self.interval
+        if send_at > now:
+            time.sleep(send_at - now)
+
+
+def iter_reminder_batches():
+    """Yield pages of ids of users with weekly reminders on and at least one push subscription"""
+    last_id = 0
+    while True:
+        user_ids = [row.id for row in db.session.query(User.id).filter(
+            User.id > last_id,
+            or_(User.weekly_reminders_enabled.is_(None), User.weekly_reminders_enabled == True),
+            PushSubscription.query.filter(PushSubscription.user_id == User.id).exists()
+        ).order_by(User.id).limit(REMINDER_BATCH_SIZE)]
+        if not user_ids:
+            return
+        yield user_ids
+        last_id = user_ids[-1]
+
+
+def subscriptions_by_user(user_ids):
+    """Load the push subscriptions for a page of users in one query"""
+    subscriptions = defaultdict(list)
+    for sub in PushSubscription.query.filter(PushSubscription.user_id.in_(user_ids)):
+        subscriptions[sub.user_id].append({
+            'id': sub.id,
+            'endpoint': sub.endpoint,
+            'keys': {
+                'p256dh': sub.p256dh_key,
+                'auth': sub.auth_key
+            }
+        })
+    return subscriptions
+
+
+def send_to_subscriptions(client, limiter, subscriptions, payload):
+    """Send one user's reminder to each of their subscriptions (runs on a pool thread, no DB access)
     
-    success_count = 0
+    Returns (pushes sent, pushes failed, ids of expired subscriptions).
+    """
+    sent, failed, expired = 0, 0, []
     for sub in subscriptions:
+        limiter.wait()
         try:
-            webpush(
-                subscription_info={
-                    'endpoint': sub.endpoint,
-                    'keys': {
-                        'p256dh': sub.p256dh_key,
-                        'auth': sub.auth_key
-                    }
-                },
-                data=payload,
-                vapid_private_key=VAPID_PRIVATE_KEY,
-                vapid_claims=vapid_claims
-            )
-            success_count += 1
+            client.send({'endpoint': sub['endpoint'], 'keys': sub['keys']}, payload)
+            sent += 1
         except Exception as e:
+            failed += 1
             error_msg = str(e)
             # Remove invalid subscriptions (410 Gone or 404 Not Found)
             if '410' in error_msg or '404' in error_msg:
-                db.session.delete(sub)
+                expired.append(sub['id'])
+    return sent, failed, expired
+
+
+def send_reminders(title, body_for_batch, url='/'):
+    """Stream reminder pushes to every eligible user
+    
+    body_for_batch(user_ids) returns {user_id: body} for a page of users; users left out are skipped.
+    Returns the number of users reminded.
+    """
+    if not VAPID_PUBLIC_KEY or not VAPID_PRIVATE_KEY:
+        print(f"⚠️  VAPID keys not configured")
+        return 0
+    
+    try:
+        from push_client import get_push_client
+    except ImportError:
+        print(f"⚠️  pywebpush not installed")
+        return 0
+    
+    client = get_push_client(VAPID_PRIVATE_KEY, VAPID_EMAIL)
+    limiter = RateLimiter(REMINDER_RATE_LIMIT)
+    stats = defaultdict(int)
+    started = time.monotonic()
+    
+    with ThreadPoolExecutor(max_workers=REMINDER_WORKERS) as pool:
+        for user_ids in iter_reminder_batches():
+            stats['users'] += len(user_ids)
+            bodies = body_for_batch(user_ids)
+            stats['skipped'] += len(user_ids) - len(bodies)
+            subscriptions = subscriptions_by_user(list(bodies))
+            
+            futures = [
+                pool.submit(send_to_subscriptions, client, limiter, subscriptions[user_id],
+                            json.dumps({'title': title, 'body': body, 'url': url}))
+                for user_id, body in bodies.items()
+            ]
+            expired = []
+            for future in futures:
+                sent, failed, expired_ids = future.result()
+                stats['reminded' if sent else 'failed'] += 1
+                stats['pushes_sent'] += sent
+                stats['pushes_failed'] += failed
+                expired.extend(expired_ids)
+            
+            if expired:
+                PushSubscription.query.filter(PushSubscription.id.in_(expired)).delete(synchronize_session=False)
                 db.session.commit()
+                stats['expired'] += len(expired)
+            print(f"   📦 Batch up to user {user_ids[-1]}: {stats['reminded']} reminded so far")
     
-    return success_count > 0
+    elapsed = time.monotonic() - started
+    pushes = stats['pushes_sent'] + stats['pushes_failed']
+    print(f"\n📊 {stats['users']} eligible users, {stats['reminded']} reminded, {stats['skipped']} skipped, {stats['failed']} failed")
+    print(f"📊 {stats['pushes_sent']} pushes sent, {stats['pushes_failed']} failed, {stats['expired']} expired subscriptions removed")
+    print(f"📊 {elapsed:.1f}s elapsed, {pushes / elapsed if elapsed else 0:.1f} pushes/s")
+    return stats['reminded']
 
 
-def get_friends_with_availability(user_id):
-    """Count how many friends have future availability"""
-    today_str = date.today().isoformat()
-    
-    # Get all friendships
-    friendships = Friendship.query.filter(
-        (Friendship.user_id_1 == user_id) | (Friendship.user_id_2 == user_id)
-    ).all()
+def get_friends_with_availability_counts():
+    """Count, for every user at once, how many friends have availability today or later
     
-    count = 0
-    for f in friendships:
-        friend_id = f.user_id_2 if f.user_id_1 == user_id else f.user_id_1
-        
-        # Check if friend has future availability
-        avail = UserAvailability.query.filter_by(user_id=friend_id).order_by(UserAvailability.updated_at.desc()).first()
-        if avail and avail.time_slots:
-            future_slots = [s for s in avail.time_slots if s.get('date', '') >= today_str]
-            if len(future_slots) > 0:
-                count += 1
+    One grouped query over both directions of each friendship, joined to each friend's
+    current availability. Users with no such friends are absent from the result.
+    """
+    friend_edges = db.union_all(
+        db.select(Friendship.user_id_1.label('user_id'), Friendship.user_id_2.label('friend_id')),
+        db.select(Friendship.user_id_2, Friendship.user_id_1)
+    ).subquery()
     
-    return count
+    rows = db.session.execute(
+        db.select(friend_edges.c.user_id, db.func.count())
+        .join(User, User.id == friend_edges.c.friend_id)
+        .join(UserAvailability, UserAvailability.id == User.current_availability_id)
+        .where(UserAvailability.last_slot_date >= date.today())
+        .group_by(friend_edges.c.user_id)
+    )
+    return dict(rows.all())
 
 
 def send_sunday_reminders():
     """Send Sunday evening reminders to all users who have weekly reminders enabled"""
     with app.app_context():
-        users = User.query.all()
-        print(f"📋 Found {len(users)} users")
-        
-        sent_count = 0
-        
-        for user in users:
-            print(f"👤 {user.name}")
-            
-            reminders_enabled = user.weekly_reminders_enabled if user.weekly_reminders_enabled is not None else True
-            
-            if not reminders_enabled:
-                print(f"   ⏭️  Skipped (weekly reminders disabled)")
-                continue
-            
-            if send_push_notification(
-                user.id,
-                "Time to plan your week! 📅",
-                "Share your availability so friends know when you're free.",
-                "/"
-            ):
-                sent_count += 1
-                print(f"   🔔 ✅ Sent push reminder")
-            else:
-                print(f"   🔔 ❌ Failed to send (no subscription)")
-        
+        body = "Share your availability so friends know when you're free."
+        sent_count = send_reminders(
+            "Time to plan your week! 📅",
+            lambda user_ids: {user_id: body for user_id in user_ids}
+        )
         print(f"\n✅ Sent {sent_count} Sunday reminder(s)")
         return sent_count
 
@@ -146,41 +207,20 @@ def send_sunday_reminders():
 def send_wednesday_reminders():
     """Send Wednesday evening reminders with friend availability count"""
     with app.app_context():
-        users = User.query.all()
-        print(f"📋 Found {len(users)} users")
-        
-        sent_count = 0
+        friend_counts = get_friends_with_availability_counts()
+        print(f"📋 {len(friend_counts)} users have friends with availability")
         
-        for user in users:
-            print(f"👤 {user.name}")
-            
-            reminders_enabled = user.weekly_reminders_enabled if user.weekly_reminders_enabled is not None else True
-            
-            if not reminders_enabled:
-                print(f"   ⏭️  Skipped (weekly reminders disabled)")
-                continue
-            
-            # Count friends with availability
-            friends_with_avail = get_friends_with_availability(user.id)
-            
+        def wednesday_bodies(user_ids):
             # Only send if friends have availability
-            if friends_with_avail == 0:
-                print(f"   ⏭️  Skipped (no friends with availability)")
-                continue
-            
-            friend_text = f"{friends_with_avail} {'friend has' if friends_with_avail == 1 else 'friends have'}"
-            
-            if send_push_notification(
-                user.id,
-                "Time to plan your weekend! 🎉",
-                f"{friend_text} shared their availability!",
-                "/"
-            ):
-                sent_count += 1
-                print(f"   🔔 ✅ Sent push reminder ({friends_with_avail} friends with availability)")
-            else:
-                print(f"   🔔 ❌ Failed to send (no subscription)")
+            bodies = {}
+            for user_id in user_ids:
+                friends_with_avail = friend_counts.get(user_id)
+                if friends_with_avail:
+                    friend_text = f"{friends_with_avail} {'friend has' if friends_with_avail == 1 else 'friends have'}"
+                    bodies[user_id] = f"{friend_text} shared their availability!"
+            return bodies
         
+        sent_count = send_reminders("Time to plan your weekend! 🎉", wednesday_bodies)
         print(f"\n✅ Sent {sent_count} Wednesday reminder(s)")
         return sent_count
 
@@ -4,11 +4,14 @@ let selectedFriends = [];
 let allFriends = [];
 let selectedTimeSlots = [];
 let originalTimeSlots = []; // Track the saved state to detect changes
+let availabilityVersion = null; // Version of the saved availability the deltas are based on
 let currentPlanId = null;
 let planningMode = 'setup'; // setup, selecting, planning, viewing
 let weekDays = []; // Store the 7 days of current week starting from today
 let lastNotificationCount = null; // Track notification count to detect new ones (null = not initialized)
 let lastNotificationData = null; // Track last rendered data to avoid unnecessary re-renders
+let loadedNotifications = []; // Notifications loaded so far, newest first
+let notificationsHasMore = false; // Whether older notifications exist beyond the loaded ones
 let pushSubscription = null; // Store current push subscription
 
 // =====================
@@ -373,6 +376,11 @@ function formatNotificationMessage(message, fromUserName) {
     return message.replace(new RegExp(escapedName, 'g'), `<strong>${fromUserName}</strong>`);
 }
 
+// Show how many repeats were rolled up into a notification, e.g. "×3"
+function formatRollupCount(notif) {
+    return notif.rollup_count > 1 ? ` <span class="notification-rollup">×${notif.rollup_count}</span>` : '';
+}
+
 // Add days to a YYYY-MM-DD date string (pure math, no Date objects!)
 function addDaysToDateString(dateStr, daysToAdd) {
     const [year, month, day] = dateStr.split('-').map(Number);
@@ -513,8 +521,8 @@ document.addEventListener('DOMContentLoaded', async () => {
             // Load plans for unread message badge
             loadPlans();
             
-            // Check for new notifications every 10 seconds (which will auto-refresh calendar)
-            setInterval(loadNotifications, 10000);
+            // Get new notifications pushed over a live stream (which will auto-refresh calendar)
+            connectEventStream();
             
             // Check for new plan messages every 15 seconds
             startPlansBadgePolling();
@@ -537,8 +545,8 @@ document.addEventListener('DOMContentLoaded', async () => {
                 const hasHash = window.location.hash === '#notifications';
                 
                 // Check if there are NEW pending hangout invites we haven't shown yet
-                const response = await fetch(`/api/notifications/${plannerInfo.id}`);
-                const notifications = await response.json();
+                const response = await fetch(`/api/notifications/${plannerInfo.id}?limit=50`);
+                const { notifications } = await response.json();
                 
                 // Get list of invite IDs we've already auto-opened for
                 const seenInvites = JSON.parse(localStorage.getItem('seenHangoutInvites') || '[]');
@@ -642,6 +650,7 @@ async function setupPlanner(event) {
             loadMyAvailability();
             loadFriendsAvailability();
             loadNotifications();
+            connectEventStream();
             
             // Initialize push notifications
             initPushNotifications();
@@ -1729,22 +1738,43 @@ async function autoSaveAvailability() {
     
     isSaving = true;
     
+    // Send only the slots that changed since the last save
+    const sentTimeSlots = JSON.parse(JSON.stringify(selectedTimeSlots));
+    const { added, removed } = getAvailabilityDelta(originalTimeSlots, sentTimeSlots);
+    
     try {
         const response = await fetch('/api/my-availability', {
-            method: 'POST',
+            method: 'PATCH',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
-                time_slots: selectedTimeSlots
+                added,
+                removed,
+                version: availabilityVersion
             })
         });
         
+        const data = await response.json();
         if (response.ok) {
-            // Update original state to match current (no more "changes")
-            originalTimeSlots = JSON.parse(JSON.stringify(selectedTimeSlots));
+            // Update original state to what was sent (later taps are saved on the next round)
+            originalTimeSlots = sentTimeSlots;
+            availabilityVersion = data.version;
             updateActiveStatus(true, 7);  // Just saved = 7 days remaining
             loadFriendsAvailability();
+        } else if (response.status === 409) {
+            // Saved from another device - rebase our unsaved changes onto the latest version and retry
+            const serverTimeSlots = data.availability ? data.availability.time_slots : [];
+            const { added: localAdded, removed: localRemoved } = getAvailabilityDelta(originalTimeSlots, selectedTimeSlots);
+            const removedKeys = new Set(localRemoved.map(s => `${s.date}_${s.slot}`));
+            const rebased = serverTimeSlots.filter(s => !removedKeys.has(`${s.date}_${s.slot}`));
+            const rebasedKeys = new Set(rebased.map(s => `${s.date}_${s.slot}`));
+            localAdded.forEach(s => {
+                if (!rebasedKeys.has(`${s.date}_${s.slot}`)) rebased.push(s);
+            });
+            originalTimeSlots = serverTimeSlots;
+            selectedTimeSlots = rebased;
+            availabilityVersion = data.version;
+            renderSelectedTimeSlots();
         } else {
-            const data = await response.json();
             showStatus(data.error || 'Error saving', 'error');
         }
     } catch (error) {
@@ -1753,6 +1783,32 @@ async function autoSaveAvailability() {
     } finally {
         isSaving = false;
     }
+    
+    // Save anything that changed while this request was in flight
+    if (hasAvailabilityChanges()) {
+        scheduleAutoSave();
+    }
+}
+
+// Slots added and removed going from one slot list to another
+function getAvailabilityDelta(fromSlots, toSlots) {
+    // Legacy day-index slots have no date and can't be addressed by a delta
+    fromSlots = fromSlots.filter(s => s.date);
+    toSlots = toSlots.filter(s => s.date);
+    const fromSet = new Set(fromSlots.map(s => `${s.date}_${s.slot}`));
+    const toSet = new Set(toSlots.map(s => `${s.date}_${s.slot}`));
+    return {
+        added: toSlots.filter(s => !fromSet.has(`${s.date}_${s.slot}`)).map(s => ({ date: s.date, slot: s.slot })),
+        removed: fromSlots.filter(s => !toSet.has(`${s.date}_${s.slot}`)).map(s => ({ date: s.date, slot: s.slot }))
+    };
+}
+
+// Sync the calendar's selected classes with selectedTimeSlots
+function renderSelectedTimeSlots() {
+    const selectedKeys = new Set(selectedTimeSlots.map(s => `${s.date}_${s.slot}`));
+    document.querySelectorAll('.time-slot[data-date][data-slot]').forEach(el => {
+        el.classList.toggle('selected', selectedKeys.has(`${el.dataset.date}_${el.dataset.slot}`));
+    });
 }
 
 // Show slot popup menu
@@ -2193,6 +2249,7 @@ async function loadMyAvailability() {
                 selectedTimeSlots = data.availability.time_slots;
                 // Store original state to track changes
                 originalTimeSlots = JSON.parse(JSON.stringify(data.availability.time_slots));
+                availabilityVersion = data.availability.version;
                 
                 // Update the calendar display
                 selectedTimeSlots.forEach(slot => {
@@ -2211,6 +2268,7 @@ async function loadMyAvailability() {
     } else {
                 // No saved availability - reset original state
                 originalTimeSlots = [];
+                availabilityVersion = null;
                 updatePlanButton();
             }
         }
@@ -2261,6 +2319,7 @@ async function saveMyAvailability() {
             showStatus('Availability saved! Your friends can now see when you\'re free.', 'success');
             // Update original state to match current (no more "changes")
             originalTimeSlots = JSON.parse(JSON.stringify(selectedTimeSlots));
+            availabilityVersion = data.version;
             updateActiveStatus(true, 7);  // Just saved = 7 days remaining
             loadFriendsAvailability();
             updatePlanButton();  // Will now be inactive since no changes
@@ -2723,24 +2782,48 @@ async function closeInstallPopup() {
 }
 
 // Notifications functions
-async function loadNotifications() {
+// Polls only fetch notifications newer than the ones already loaded; pass { refresh: true }
+// to reload the first page after something changed existing notifications (e.g. an RSVP)
+async function loadNotifications(options = {}) {
     if (!plannerInfo || !plannerInfo.id) {
         return;
     }
     
     try {
+        const newestId = loadedNotifications.length > 0 ? loadedNotifications[0].id : null;
+        const isDelta = !options.refresh && lastNotificationCount !== null && newestId !== null;
+        const notifUrl = isDelta
+            ? `/api/notifications/${plannerInfo.id}?since_id=${newestId}&limit=50`
+            : `/api/notifications/${plannerInfo.id}?limit=50`;
+        
         // Load both notifications and friend requests
         const [notifResponse, friendReqResponse] = await Promise.all([
-            fetch(`/api/notifications/${plannerInfo.id}`),
+            fetch(notifUrl),
             fetch('/api/friend-requests')
         ]);
         
-        const notifications = await notifResponse.json();
+        const data = await notifResponse.json();
         const friendRequests = friendReqResponse.ok ? await friendReqResponse.json() : [];
         
-        // Check if we have new notifications (more than before)
-        const currentCount = notifications.length + friendRequests.length;
-        if (lastNotificationCount !== null && currentCount > lastNotificationCount) {
+        let newNotificationCount = 0;
+        if (isDelta && data.has_more) {
+            // Too many new ones to merge - start over from the first page
+            return loadNotifications({ refresh: true });
+        } else if (isDelta) {
+            // The delta also repeats recent rows (they can commit out of id order), so merge by id
+            const loadedIds = new Set(loadedNotifications.map(n => n.id));
+            const newNotifications = data.notifications.filter(n => !loadedIds.has(n.id));
+            newNotificationCount = newNotifications.length;
+            loadedNotifications = newNotifications.concat(loadedNotifications).sort((a, b) => b.id - a.id);
+        } else {
+            newNotificationCount = newestId !== null ? data.notifications.filter(n => n.id > newestId).length : 0;
+            loadedNotifications = data.notifications;
+            notificationsHasMore = data.has_more;
+        }
+        
+        // Check if we have new notifications or friend requests
+        const currentCount = friendRequests.length;
+        if (lastNotificationCount !== null && (newNotificationCount > 0 || currentCount > lastNotificationCount)) {
             console.log('New notification detected, refreshing data');
             // Refresh linked friends (for active status), then friends list
             await loadLinkedFriends();
@@ -2753,7 +2836,8 @@ async function loadNotifications() {
         lastNotificationCount = currentCount;
         
         // Update badge count (unread notifications + pending friend requests)
-        const unreadCount = notifications.filter(n => !n.read).length + friendRequests.length;
+        lastUnreadCount = data.unread_count;
+        const unreadCount = data.unread_count + friendRequests.length;
         const badge = document.getElementById('notificationBadge');
         const headerBadge = document.getElementById('notificationBadgeHeader');
         if (unreadCount > 0) {
@@ -2771,16 +2855,34 @@ async function loadNotifications() {
         }
         
         // Only re-render if data has changed (prevents icon blinking)
-        const currentData = JSON.stringify({ notifications, friendRequests });
+        const currentData = JSON.stringify({ loadedNotifications, friendRequests, notificationsHasMore });
         if (currentData !== lastNotificationData) {
             lastNotificationData = currentData;
-            renderNotifications(notifications, friendRequests);
+            renderNotifications(loadedNotifications, friendRequests);
         }
     } catch (error) {
         console.error('Error loading notifications:', error);
     }
 }
 
+// Load the next page of older notifications
+async function loadOlderNotifications() {
+    if (!plannerInfo || !plannerInfo.id || loadedNotifications.length === 0) {
+        return;
+    }
+    
+    try {
+        const oldestId = loadedNotifications[loadedNotifications.length - 1].id;
+        const response = await fetch(`/api/notifications/${plannerInfo.id}?before_id=${oldestId}&limit=50`);
+        const data = await response.json();
+        loadedNotifications = loadedNotifications.concat(data.notifications);
+        notificationsHasMore = data.has_more;
+        await loadNotifications();
+    } catch (error) {
+        console.error('Error loading older notifications:', error);
+    }
+}
+
 function renderNotifications(notifications, friendRequests = []) {
     const list = document.getElementById('notificationsList');
     
@@ -2844,7 +2946,7 @@ function renderNotifications(notifications, friendRequests = []) {
                         </div>
                         <div class="notification-content">
                             <div class="notification-header">
-                                <div class="notification-text">${formatNotificationMessage(notif.message, notif.from_user_name)}</div>
+                                <div class="notification-text">${formatNotificationMessage(notif.message, notif.from_user_name)}${formatRollupCount(notif)}</div>
                                 <div class="notification-time">${timeAgo}</div>
                             </div>
                             ${inviteeList ? `<div class="notification-invitees">${inviteeList}</div>` : ''}
@@ -2875,7 +2977,7 @@ function renderNotifications(notifications, friendRequests = []) {
                         </div>
                         <div class="notification-content">
                             <div class="notification-header">
-                                <div class="notification-text">${formatNotificationMessage(notif.message, notif.from_user_name)}</div>
+                                <div class="notification-text">${formatNotificationMessage(notif.message, notif.from_user_name)}${formatRollupCount(notif)}</div>
                                 <div class="notification-time">${timeAgo}</div>
                             </div>
                         </div>
@@ -2904,7 +3006,7 @@ function renderNotifications(notifications, friendRequests = []) {
                         </div>
                         <div class="notification-content">
                             <div class="notification-header">
-                                <div class="notification-text">${formatNotificationMessage(notif.message, notif.from_user_name)}</div>
+                                <div class="notification-text">${formatNotificationMessage(notif.message, notif.from_user_name)}${formatRollupCount(notif)}</div>
                                 <div class="notification-time">${timeAgo}</div>
                             </div>
                         </div>
@@ -2928,7 +3030,11 @@ function renderNotifications(notifications, friendRequests = []) {
             }
         }).join('');
         
-        list.innerHTML = friendRequestsHtml + notificationsHtml;
+        const olderHtml = notificationsHasMore
+            ? '<button class="btn-load-older" onclick="loadOlderNotifications()">Show older</button>'
+            : '';
+        
+        list.innerHTML = friendRequestsHtml + notificationsHtml + olderHtml;
     } catch (error) {
         console.error('Error rendering notifications:', error);
     }
@@ -2946,7 +3052,7 @@ async function respondToHangout(hangoutId, response) {
         if (res.ok) {
             const data = await res.json();
             showStatus(data.message, 'success');
-            loadNotifications(); // Refresh notifications
+            loadNotifications({ refresh: true }); // Refresh notifications
             loadHangoutStatuses(); // Refresh calendar display
         } else {
             const data = await res.json();
@@ -2967,7 +3073,7 @@ async function acceptFriendRequest(requestId) {
         
         if (response.ok) {
             showStatus('Friend request accepted!', 'success');
-            loadNotifications();
+            loadNotifications({ refresh: true });
             await loadFriends();  // Reload contacts (includes new reciprocal contact)
             loadLinkedFriends();  // Reload linked friends
             loadFriendsAvailability();
@@ -2990,7 +3096,7 @@ async function rejectFriendRequest(requestId) {
         
         if (response.ok) {
             showStatus('Friend request declined', 'success');
-            loadNotifications();
+            loadNotifications({ refresh: true });
         } else {
             const data = await response.json();
             showStatus(data.error || 'Failed to decline request', 'error');
@@ -3021,13 +3127,13 @@ async function openNotifications() {
     closeAllNavModals();
     document.getElementById('notificationsModal').classList.add('active');
     document.querySelector('.bottom-nav').style.display = 'none';
-    await loadNotifications();
+    await loadNotifications({ refresh: true });
     
     // Mark all as read
     if (plannerInfo && plannerInfo.id) {
         fetch(`/api/notifications/${plannerInfo.id}/mark-read`, {
             method: 'POST'
-        });
+        }).then(() => loadedNotifications.forEach(n => { n.read = true; }));
         
         // Hide badges immediately
         const badge = document.getElementById('notificationBadge');
@@ -3041,7 +3147,7 @@ async function openNotifications() {
         clearInterval(notificationUpdateInterval);
     }
     notificationUpdateInterval = setInterval(() => {
-        loadNotifications();
+        if (!eventStreamConnected) loadNotifications();
     }, 5000);
 }
 
@@ -3056,10 +3162,49 @@ function closeNotifications() {
     }
 }
 
-// Poll for new notifications every 30 seconds
+// Live notifications: the server pushes an event whenever a notification or friend request
+// arrives, and EventSource reconnects (resuming from the last event id) on its own
+let eventSource = null;
+let eventStreamConnected = false;
+let lastUnreadCount = null; // Unread count from the last load, to spot new notifications cheaply
+
+function connectEventStream() {
+    if (eventSource || !window.EventSource) return;
+    
+    eventSource = new EventSource('/api/events/stream');
+    let reconnecting = false;
+    eventSource.onopen = () => {
+        eventStreamConnected = true;
+        // Catch up on friend requests the unread-count poll can't see while the stream was down
+        if (reconnecting) loadNotifications();
+    };
+    eventSource.onerror = () => {
+        reconnecting = true;
+        // Fall back to polling until the stream reconnects
+        eventStreamConnected = false;
+    };
+    eventSource.addEventListener('notification', () => loadNotifications());
+    eventSource.addEventListener('friend_request', () => loadNotifications());
+}
+
+// Check the unread count every 30 seconds when the live stream isn't available,
+// and only load notifications when it changed
+async function checkUnreadCount() {
+    try {
+        const response = await fetch(`/api/notifications/${plannerInfo.id}/unread-count`);
+        if (!response.ok) return;
+        const data = await response.json();
+        if (data.unread_count !== lastUnreadCount) {
+            loadNotifications();
+        }
+    } catch (error) {
+        console.error('Error checking unread count:', error);
+    }
+}
+
 setInterval(() => {
-    if (plannerInfo && plannerInfo.id) {
-        loadNotifications();
+    if (plannerInfo && plannerInfo.id && !eventStreamConnected) {
+        checkUnreadCount();
     }
 }, 30000);
 